@@ -2,6 +2,17 @@ import streamlit as st
 import pandas as pd
 import joblib
 import numpy as np
+import os
+
+from utils.artifacts import load_artifact
+from utils.cohort import CohortTable
+from utils.explain import FEATURES, ExplanationCache, top_reasons
+from utils.monitoring import DriftMonitor, configure_logging, load_reference_stats
+from utils.preprocessing import CATEGORICAL_FEATURES, unpack_records
+from utils.registry import ModelBundle, RegistryWatcher, current_version
+from utils.routing import load_region_monitors, load_router
+from utils.validation import validate_records
+from utils.whatif import sensitivity_sweep
 
 # ------------------------------------------------------------------------------------------------
 # 1. PAGE CONFIGURATION & STYLING
@@ -453,21 +464,125 @@ st.markdown("""
 # ------------------------------------------------------------------------------------------------
 # 2. LOAD MODEL & TOOLS
 # ------------------------------------------------------------------------------------------------
+# Models are served from pickle-free artifacts only (utils/artifacts.py): the registry's model.bin files,
+# or models/diabrisk_model.bin. Loading them never executes code from storage.
+# Unpickling a joblib model is an explicit opt-in: DIABRISK_MODEL=models/xgb_model.joblib serves that
+# estimator (any model with predict/predict_proba, e.g. the XGBoost candidate) and wins over everything else.
+MODEL_PATH = os.environ.get('DIABRISK_MODEL')
+REGISTRY_DIR = 'models/registry'
+SAFE_ARTIFACT_PATH = 'models/diabrisk_model.bin'
+# One registry per hospital region (models/regions/<region>/), published by utils/routing.py
+REGIONS_DIR = 'models/regions'
+REGION_COLUMN = 'Region'  # Batch files with this column are routed to each row's regional model
+
+def load_fixed_bundle():
+    """The safe artifact exported by 03_modeling, or None if there is none."""
+    if not os.path.exists(SAFE_ARTIFACT_PATH):
+        return None
+    model, preprocessor, _ = load_artifact(SAFE_ARTIFACT_PATH)
+    return ModelBundle('safe', model, preprocessor, None)
+
 @st.cache_resource
 def load_assets():
+    """
+    Returns a function that gives the active ModelBundle (or None).
+    - DIABRISK_MODEL, when set, is unpickled and served as is.
+    - If bundles are published in the registry, a background watcher hot-swaps new versions.
+    - Otherwise the safe artifact in models/ is loaded once.
+    """
+    try:
+        if MODEL_PATH is not None:
+            bundle = ModelBundle('local', joblib.load(MODEL_PATH), joblib.load('models/preprocessor.joblib'), None)
+            return lambda: bundle
+
+        if current_version(REGISTRY_DIR) is not None:
+            watcher = RegistryWatcher(REGISTRY_DIR)
+            if watcher.current() is not None:
+                return watcher.current
+            # The active version could not be loaded (e.g. hash mismatch): serve the safe artifact meanwhile.
+            # The watcher keeps retrying and takes over as soon as a valid version is active.
+            fallback = load_fixed_bundle()
+            return lambda: watcher.current() or fallback
+
+        bundle = load_fixed_bundle()
+        return lambda: bundle
+    except Exception as e:
+        return None
+
+get_bundle = load_assets()
+
+@st.cache_resource
+def load_region_router():
+    """All region bundles in one router (identical preprocessors are shared), or None if there are none."""
     try:
-        model = joblib.load('models/best_model.joblib')
-        preprocessor = joblib.load('models/preprocessor.joblib')
-        return model, preprocessor
+        return load_router(REGIONS_DIR)
     except Exception as e:
-        return None, None
+        return None
 
-model, preprocessor = load_assets()
+router = load_region_router()
 
-if model is None:
+# Take one snapshot per script run: model and preprocessor always come from the same version
+bundle = get_bundle() if get_bundle is not None else None
+region = None
+if router is not None:
+    region = st.sidebar.selectbox("🏥 Hospital region", router.keys(), help="Each region has its own model")
+    bundle = router.bundle(region)
+
+if bundle is None:
     st.error("⚠️ System Error: Model files not found. Please run the training notebooks first.")
     st.stop()
 
+model, preprocessor = bundle.model, bundle.preprocessor
+
+@st.cache_resource
+def load_drift_monitors():
+    """
+    Shared input-drift monitors. With regional models every region has its own monitor and training
+    reference (regions differ in Age and symptom prevalence); otherwise one monitor uses the reference
+    saved by 02_data_preparation. Returns {name: DriftMonitor} ('default' without regions).
+    """
+    configure_logging()  # Drift metrics are logged at INFO level, which Python drops by default
+    if router is not None:
+        return load_region_monitors(REGIONS_DIR)
+    try:
+        return {'default': DriftMonitor(load_reference_stats('models/drift_reference.json'))}
+    except FileNotFoundError:
+        return {}
+
+drift_monitors = load_drift_monitors()
+
+def update_drift(name, keys):
+    """Feeds packed records to the drift monitor of a region ('default' without regions), if it has one."""
+    monitor = drift_monitors.get(name)
+    if monitor is not None and len(keys):
+        monitor.update(unpack_records(keys))  # Constant-memory running stats, no raw record is kept
+
+# Explainers for the live bundles (every region, or the active version) plus the previous version during a
+# hot swap. Older versions are evicted, so swapped-out models and their SafeForest copies can be freed.
+EXPLAINER_CACHE_SIZE = (len(router) if router is not None else 1) + 1
+
+@st.cache_resource(max_entries=EXPLAINER_CACHE_SIZE)
+def load_explainer(version, _model, _preprocessor):
+    """One cached explainer per model version (Random Forest models only)."""
+    try:
+        return ExplanationCache(_model, _preprocessor)
+    except TypeError:
+        return None
+
+explainer = load_explainer(bundle.version, model, preprocessor)
+
+# Session-scoped cohorts of scored patients, one per region so every patient keeps the score of its own
+# region's model. They survive reruns and are rescored only if that region's model version changes.
+def region_cohort(name, region_bundle):
+    cohorts = st.session_state.setdefault('cohorts', {})
+    if name not in cohorts:
+        cohorts[name] = CohortTable()
+    cohorts[name].sync_model(region_bundle.version, region_bundle.model, region_bundle.preprocessor)
+    return cohorts[name]
+
+cohort_name = region if region is not None else 'default'
+region_cohort(cohort_name, bundle)
+
 # ------------------------------------------------------------------------------------------------
 # 3. UI LAYOUT
 # ------------------------------------------------------------------------------------------------
@@ -524,8 +639,8 @@ with st.form("prediction_form"):
 # ------------------------------------------------------------------------------------------------
 if submit_btn:
     with st.spinner('⚡ Neural Processing Activated...'):
-        # Create DataFrame
-        input_data = pd.DataFrame({
+        # Collect the record and create DataFrame
+        record = {
             'Age': [age],
             'Polyuria': [polyuria],
             'Polydipsia': [polydipsia],
@@ -541,13 +656,27 @@ if submit_btn:
             'muscle stiffness': [muscle_stiffness],
             'Alopecia': [alopecia],
             'Obesity': [obesity]
-        })
+        }
+        input_data = pd.DataFrame(record)
 
         try:
             # Transform and predict
             processed_data = preprocessor.transform(input_data)
+            monitor = drift_monitors.get(cohort_name)
+            if monitor is not None:
+                monitor.update(record)  # Constant-memory running stats, no raw record is kept
             prediction = model.predict(processed_data)[0]
             probability = model.predict_proba(processed_data)[0][1]
+            st.session_state['cohorts'][cohort_name].add(record, model, preprocessor, probability=[probability])
+
+            # Key drivers of this score (per-patient feature attributions, cached by profile)
+            reasons_html = ""
+            if explainer is not None:
+                contributions = explainer.explain(input_data)[0]
+                reasons = [f"{'🔺' if value > 0 else '🔻'} {label}: {value:+.1%}"
+                           for label, value in top_reasons(contributions, record)]
+                reasons_html = ("<p style='font-size: 1.05rem;'><strong>🧠 Key Drivers:</strong><br>"
+                                + "<br>".join(reasons) + "</p>")
 
             # Display Results
             st.markdown("### 📊 AI Assessment Results")
@@ -561,6 +690,7 @@ if submit_btn:
                         <p style='font-size: 1.2rem; margin: 1.8rem 0;'>
                             AI Neural Net detects <strong>high-probability diabetes signature</strong> in bio-markers.
                         </p>
+                        {reasons_html}
                         <hr>
                         <p style='font-size: 1.1rem;'>
                             <strong>🛑 Defense Protocol:</strong><br>
@@ -580,6 +710,7 @@ if submit_btn:
                         <p style='font-size: 1.2rem; margin: 1.8rem 0;'>
                             Bio-scan shows <strong>minimal diabetes vector</strong> in current profile.
                         </p>
+                        {reasons_html}
                         <hr>
                         <p style='font-size: 1.1rem;'>
                             <strong>🛡️ Maintenance Protocol:</strong><br>
@@ -592,11 +723,107 @@ if submit_btn:
                         </p>
                     </div>
                 """, unsafe_allow_html=True)
+
+            # What-If Sensitivity: all symptom flips + ages 1-120 scored in one batched call
+            st.markdown("### 🔮 What-If Sensitivity")
+            base_probability, flips, age_curve = sensitivity_sweep(model, preprocessor, record)
+            w1, w2 = st.columns(2)
+            with w1:
+                st.markdown("**📈 Risk Across Ages**")
+                st.line_chart(age_curve.set_index('Age'), height=260)
+            with w2:
+                st.markdown("**🔁 Risk Change if One Symptom Is Toggled**")
+                st.bar_chart(flips.set_index('Symptom')['Change'], height=260)
                 
         except Exception as e:
             st.error(f"❌ Neural Error: {str(e)}")
             st.info("🔧 Debug Tip: Verify preprocessor and model integrity.")
 
+# ------------------------------------------------------------------------------------------------
+# 5. COHORT WORKSPACE
+# ------------------------------------------------------------------------------------------------
+# A fragment: filtering/sorting here reruns only this function, not the CSS, header and form above
+@st.fragment
+def cohort_workspace():
+    cohort = st.session_state['cohorts'][cohort_name]
+    st.markdown("### 🗂️ Cohort Workspace")
+
+    uploaded = st.file_uploader(
+        "📂 Score a batch file (CSV with Age and the 14 symptom columns"
+        + (f", plus {REGION_COLUMN} to route rows to their region)" if router is not None else ")"), type='csv')
+    if uploaded is not None and st.session_state.get('cohort_upload') != uploaded.file_id:
+        batch = pd.read_csv(uploaded)
+        try:
+            # Normalize 'yes'/' Y '/'TRUE' etc. and reject bad rows instead of silently scoring them as "No"
+            result = validate_records(batch)
+            rows = np.flatnonzero(result.valid)
+            labels = np.array([f'Row {row + 1}' for row in rows], dtype=object)
+            errors = result.errors
+            if router is not None and REGION_COLUMN in batch:
+                # Mixed-region file: one vectorized call per region, each row joins its region's cohort
+                regions = batch[REGION_COLUMN].to_numpy()[rows]
+                probability, routed_to = router.score(unpack_records(result.keys), regions)
+                for name in pd.unique(regions[pd.notna(routed_to)]):
+                    in_region = (regions == name) & pd.notna(routed_to)
+                    region_cohort(str(name), router.bundle(name)).add_keys(
+                        result.keys[in_region], None, None, list(labels[in_region]), probability[in_region])
+                    update_drift(str(name), result.keys[in_region])  # Each region against its own reference
+                routing_errors = router.routing_errors(batch[REGION_COLUMN], REGION_COLUMN)
+                errors = pd.concat([errors, routing_errors[np.isin(routing_errors['row'], rows)]],
+                                   ignore_index=True)
+            else:
+                cohort.add_keys(result.keys, model, preprocessor, list(labels))  # Only new profiles reach the model
+                update_drift(cohort_name, result.keys)  # Batch traffic counts towards drift too
+            st.session_state['cohort_upload_errors'] = errors
+        except ValueError as e:
+            st.session_state['cohort_upload_errors'] = pd.DataFrame({'row': [None], 'column': [None],
+                                                                      'value': [None], 'error': [str(e)]})
+        st.session_state['cohort_upload'] = uploaded.file_id
+
+    upload_errors = st.session_state.get('cohort_upload_errors')
+    if upload_errors is not None and len(upload_errors):
+        st.warning(f"⚠️ {upload_errors['row'].nunique()} row(s) of the uploaded file were skipped.")
+        with st.expander("Validation report"):
+            st.dataframe(upload_errors, width='stretch', hide_index=True)
+
+    if len(cohort) == 0:
+        st.info("🩺 Scored patients will appear here for the rest of the session.")
+        return
+
+    f1, f2, f3 = st.columns(3)
+    with f1:
+        cohort.threshold = st.slider("Risk threshold", 0.05, 0.95, float(cohort.threshold), 0.05)
+        only_at_risk = st.checkbox("Only at-risk patients")
+    with f2:
+        symptoms = st.multiselect("Must have symptoms", CATEGORICAL_FEATURES)
+        age_range = st.slider("Age range", 1, 120, (1, 120))
+    with f3:
+        sort_by = st.selectbox("Sort by", ['probability', 'age', 'entry'])
+        descending = st.checkbox("Descending", value=True)
+
+    summary = cohort.summary()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Patients", summary['patients'])
+    m2.metric("At Risk", summary['at_risk'])
+    m3.metric("Mean Risk", f"{summary['mean_probability']:.1%}")
+
+    rows = cohort.select(only_at_risk, 0.0, symptoms, age_range, sort_by, descending)
+    table = cohort.to_frame(rows)
+    st.dataframe(table, width='stretch', hide_index=True)
+
+    # Batch output with per-patient explanations
+    export = table
+    if explainer is not None and len(table):
+        export = pd.concat([table, explainer.explain_dataframe(table[FEATURES])], axis=1)
+    st.download_button("⬇️ Download (CSV)", export.to_csv(index=False), file_name='cohort_scores.csv')
+
+    if st.button("🗑️ Clear cohort"):
+        st.session_state['cohorts'][cohort_name] = CohortTable(threshold=cohort.threshold)
+        region_cohort(cohort_name, bundle)
+        st.rerun(scope='fragment')
+
+cohort_workspace()
+
 # Medical Disclaimer
 st.markdown("""
     <div class='disclaimer-box'>
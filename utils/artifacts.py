@@ -0,0 +1,400 @@
+import json
+import mmap
+import struct
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import NODE_DTYPE, Tree
+
+# File layout (little endian):
+#   8 bytes  magic b'DIABRISK'
+#   4 bytes  uint32 length of the JSON header
+#   JSON     schema: preprocessor parameters, class labels and the position/dtype/shape of every array
+#   arrays   raw typed arrays, each aligned to 64 bytes
+# Nothing in the file is ever executed: loading only parses JSON and maps the arrays (no pickle).
+# The validated arrays are then copied into scikit-learn trees, so scoring runs at scikit-learn speed.
+# That step uses scikit-learn's private tree layout (requirements.txt pins the tested version), and every
+# load checks it against SafeForest, which only needs NumPy (see _fast_forest).
+MAGIC = b'DIABRISK'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+ALLOWED_DTYPES = {'<i4', '<i8', '<f8'}
+
+
+def _preprocessor_schema(preprocessor):
+    """Extracts the fitted ColumnTransformer (StandardScaler + OneHotEncoder) parameters as plain JSON."""
+    if preprocessor.remainder != 'drop':
+        raise ValueError("Only ColumnTransformers with remainder='drop' can be exported.")
+
+    scaler = preprocessor.named_transformers_['num']
+    encoder = preprocessor.named_transformers_['cat']
+    drop_idx = encoder.drop_idx_ if encoder.drop_idx_ is not None else [None] * len(encoder.categories_)
+
+    return {
+        'numerical': {
+            'features': [str(name) for name in scaler.feature_names_in_],
+            'mean': [float(value) for value in scaler.mean_],
+            'scale': [float(value) for value in scaler.scale_]
+        },
+        'categorical': {
+            'features': [str(name) for name in encoder.feature_names_in_],
+            'categories': [[str(value) for value in categories] for categories in encoder.categories_],
+            'drop_idx': [None if idx is None else int(idx) for idx in drop_idx]
+        },
+        'feature_names_out': [str(name) for name in preprocessor.get_feature_names_out()]
+    }
+
+
+def _forest_arrays(model):
+    """Concatenates all trees of a fitted forest into flat node arrays with global child indices."""
+    if not isinstance(model, RandomForestClassifier):
+        raise TypeError(f"Only RandomForestClassifier models can be exported, got {type(model).__name__}.")
+
+    left, right, feature, threshold, proba, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        value = tree.value[:, 0, :]
+        proba.append(value / value.sum(axis=1, keepdims=True))  # Leaf class frequencies
+        offset += tree.node_count
+
+    return {
+        'children_left': np.concatenate(left).astype('<i4'),
+        'children_right': np.concatenate(right).astype('<i4'),
+        'feature': np.concatenate(feature).astype('<i4'),
+        'threshold': np.concatenate(threshold).astype('<f8'),
+        'proba': np.concatenate(proba).astype('<f8'),
+        'roots': np.asarray(roots, dtype='<i8')
+    }
+
+
+def export_artifact(model, preprocessor, path, target_encoder=None):
+    """
+    Writes the fitted preprocessor parameters and the forest's tree arrays to one flat binary file.
+    """
+    arrays = _forest_arrays(model)
+    header = {
+        'format_version': FORMAT_VERSION,
+        'preprocessor': _preprocessor_schema(preprocessor),
+        'classes': [int(value) for value in model.classes_],
+        'class_labels': [str(value) for value in target_encoder.classes_] if target_encoder is not None else None,
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+        'arrays': {}
+    }
+
+    # Array offsets depend on the header size, so reserve room for them first and fix the layout after
+    header_size = len(json.dumps(header)) + 128 * len(arrays) + 256
+    data_start = -(-(len(MAGIC) + 4 + header_size) // ALIGNMENT) * ALIGNMENT
+    position = data_start
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': position}
+        position += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    if len(header_bytes) > header_size:
+        raise ValueError("Artifact header is larger than the reserved space.")
+    header_bytes = header_bytes.ljust(header_size)
+    with open(path, 'wb') as fh:
+        fh.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for name, array in arrays.items():
+            fh.seek(header['arrays'][name]['offset'])
+            fh.write(array.tobytes())
+        fh.truncate(position)
+
+    print(f" Exported {len(model.estimators_)} trees to {path}")
+    return path
+
+
+class SafePreprocessor:
+    """Re-implements ColumnTransformer.transform (scaled numbers + One-Hot categories) from plain parameters."""
+
+    def __init__(self, schema):
+        self.numerical = schema['numerical']
+        self.categorical = schema['categorical']
+        self.feature_names_in_ = np.array(self.numerical['features'] + self.categorical['features'], dtype=object)
+        self.feature_names_out_ = np.array(schema['feature_names_out'], dtype=object)
+
+    def get_feature_names_out(self):
+        return self.feature_names_out_
+
+    def transform(self, X: pd.DataFrame):
+        columns = []
+        for name, mean, scale in zip(self.numerical['features'], self.numerical['mean'], self.numerical['scale']):
+            columns.append((X[name].to_numpy(dtype=np.float64) - mean) / scale)
+
+        for name, categories, drop_idx in zip(self.categorical['features'], self.categorical['categories'],
+                                              self.categorical['drop_idx']):
+            values = X[name].astype(str).to_numpy()
+            for index, category in enumerate(categories):
+                if index != drop_idx:
+                    columns.append((values == category).astype(np.float64))  # Unknown values encode as all zeros
+
+        return np.column_stack(columns)
+
+
+class SafeForest:
+    """Scores the exported tree arrays directly. All trees are walked together, one level per step."""
+
+    def __init__(self, arrays, classes, max_depth):
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.proba = arrays['proba']
+        self.roots = arrays['roots']
+        self.classes_ = np.asarray(classes)
+        self.max_depth = max_depth
+        self.n_estimators = len(self.roots)
+
+    @classmethod
+    def from_model(cls, model):
+        """Builds the flat-array view of an in-memory RandomForestClassifier (no file needed)."""
+        max_depth = int(max(estimator.tree_.max_depth for estimator in model.estimators_))
+        return cls(_forest_arrays(model), model.classes_, max_depth)
+
+    def apply(self, X):
+        """Returns the leaf index reached in every tree, shape (n_samples, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)  # Same input precision as scikit-learn trees
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+        # Walk until every (row, tree) is on a leaf: children always come after their parent, so this ends
+        while True:
+            left = self.children_left[node]
+            is_leaf = left == -1
+            if is_leaf.all():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(is_leaf, node, np.where(go_left, left, self.children_right[node]))
+        return node
+
+    def predict_proba(self, X):
+        return self.proba[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def _check_schema(schema):
+    """Checks that the preprocessor parameters are consistent and produce exactly feature_names_out columns."""
+    numerical, categorical = schema['numerical'], schema['categorical']
+    n_numerical = len(numerical['features'])
+    if not len(numerical['mean']) == len(numerical['scale']) == n_numerical:
+        raise ValueError("Numerical scaler parameters don't match the numerical features.")
+    scale = np.asarray(numerical['scale'], dtype=np.float64)
+    if not np.all(np.isfinite(numerical['mean'])) or not np.all(np.isfinite(scale) & (scale != 0)):
+        raise ValueError("Invalid scaler parameters.")
+
+    if not len(categorical['categories']) == len(categorical['drop_idx']) == len(categorical['features']):
+        raise ValueError("Categorical encoder parameters don't match the categorical features.")
+    width = n_numerical
+    for categories, drop_idx in zip(categorical['categories'], categorical['drop_idx']):
+        if drop_idx is not None and (not isinstance(drop_idx, int) or not 0 <= drop_idx < len(categories)):
+            raise ValueError("Invalid drop_idx in the categorical encoder.")
+        width += len(categories) - (drop_idx is not None)
+    if width != len(schema['feature_names_out']):
+        raise ValueError(f"The preprocessor produces {width} columns, but feature_names_out lists "
+                         f"{len(schema['feature_names_out'])}.")
+
+
+def _validate(header, arrays):
+    """
+    Checks that an untrusted file is well-formed before any array is used for indexing.
+
+    Returns:
+    - depths (ndarray): Depth of every tree, measured by walking the trees (the header is not trusted).
+    """
+    _check_schema(header['preprocessor'])
+    n_nodes = len(arrays['children_left'])
+    n_features = len(header['preprocessor']['feature_names_out'])
+    for name in ('children_right', 'feature', 'threshold', 'proba'):
+        if len(arrays[name]) != n_nodes:
+            raise ValueError(f"Array '{name}' has the wrong length.")
+
+    roots = arrays['roots']
+    if roots.ndim != 1 or len(roots) == 0:
+        raise ValueError("The artifact contains no trees.")
+    # Trees are stored one after the other: roots start at 0 and increase
+    if roots[0] != 0 or np.any(np.diff(roots) <= 0) or roots[-1] >= n_nodes:
+        raise ValueError("Tree roots are out of range.")
+    tree_of = np.searchsorted(roots, np.arange(n_nodes), side='right') - 1
+
+    node_ids = np.arange(n_nodes)
+    left, right = arrays['children_left'], arrays['children_right']
+    is_split = left != -1
+    if not np.array_equal(is_split, right != -1):
+        raise ValueError("Every node must have either two children or none.")
+    for name, children in (('children_left', left), ('children_right', right)):
+        inside = (children > node_ids) & (children < n_nodes)  # Children after their parent: no cycles
+        if not np.all(~is_split | inside):
+            raise ValueError(f"Array '{name}' points outside the tree.")
+        if not np.all(tree_of[children[is_split]] == tree_of[is_split]):
+            raise ValueError(f"Array '{name}' points into another tree.")
+
+    if not np.all((arrays['feature'][is_split] >= 0) & (arrays['feature'][is_split] < n_features)):
+        raise ValueError("Split features are out of range.")
+    if not np.all(np.isfinite(arrays['threshold'][is_split])):
+        raise ValueError("Split thresholds must be finite.")
+    proba = arrays['proba']
+    if proba.ndim != 2 or proba.shape[1] != len(header['classes']):
+        raise ValueError("Leaf probabilities don't match the number of classes.")
+    if not np.all(np.isfinite(proba) & (proba >= 0)):
+        raise ValueError("Leaf probabilities must be finite and non-negative.")
+
+    # Walk every tree level by level until only leaves are left (bounded: node ids grow at every step)
+    node_depth = np.full(n_nodes, -1)
+    frontier, depth = roots, 0
+    while len(frontier):
+        node_depth[frontier] = depth
+        frontier = frontier[is_split[frontier]]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        depth += 1
+    depths = np.maximum.reduceat(node_depth, roots)
+
+    max_depth = header['max_depth']
+    if not isinstance(max_depth, int) or isinstance(max_depth, bool) or max_depth != depths.max():
+        raise ValueError("Invalid max_depth.")
+    return depths
+
+
+def _sklearn_forest(arrays, classes, n_features, depths):
+    """
+    Rebuilds a RandomForestClassifier from validated arrays, tree by tree through Tree.__setstate__
+    (plain arrays only, no pickle), so predictions run in scikit-learn's compiled code.
+    """
+    classes = np.asarray(classes)
+    n_classes = np.array([len(classes)], dtype=np.intp)
+    roots = arrays['roots']
+    ends = np.append(roots[1:], len(arrays['children_left']))
+
+    estimators = []
+    for start, end, depth in zip(roots.tolist(), ends.tolist(), depths.tolist()):
+        left = arrays['children_left'][start:end]
+        is_leaf = left == -1
+        nodes = np.zeros(end - start, dtype=NODE_DTYPE)
+        nodes['left_child'] = np.where(is_leaf, -1, left - start)  # Global -> per-tree node ids
+        nodes['right_child'] = np.where(is_leaf, -1, arrays['children_right'][start:end] - start)
+        nodes['feature'] = np.where(is_leaf, -2, arrays['feature'][start:end])
+        nodes['threshold'] = np.where(is_leaf, -2.0, arrays['threshold'][start:end])
+        nodes['n_node_samples'] = 1
+        nodes['weighted_n_node_samples'] = 1.0
+
+        tree = Tree(n_features, n_classes, 1)
+        tree.__setstate__({'max_depth': depth, 'node_count': end - start, 'nodes': nodes,
+                           'values': np.ascontiguousarray(arrays['proba'][start:end, None, :])})
+        estimator = DecisionTreeClassifier()
+        estimator.tree_ = tree
+        estimator.n_features_in_, estimator.max_features_, estimator.n_outputs_ = n_features, n_features, 1
+        estimator.classes_, estimator.n_classes_ = np.arange(len(classes), dtype=np.float64), len(classes)
+        estimators.append(estimator)
+
+    forest = RandomForestClassifier(n_estimators=len(estimators))
+    forest.estimators_ = estimators
+    forest.estimator_ = DecisionTreeClassifier()
+    forest.classes_, forest.n_classes_ = classes, len(classes)
+    forest.n_features_in_, forest.n_outputs_ = n_features, 1
+    return forest
+
+
+def _fast_forest(arrays, classes, n_features, depths, max_depth, n_probe=256):
+    """
+    Returns the scikit-learn rebuild of the forest if it scores exactly like SafeForest on random probe
+    rows. If a scikit-learn version changed its private tree layout, the artifact is served by the
+    (slower) SafeForest instead of failing to load or mis-scoring.
+    """
+    safe = SafeForest(arrays, classes, max_depth)
+    try:
+        forest = _sklearn_forest(arrays, classes, n_features, depths)
+        # Scaled Age and 0/1 one-hot columns: this range lands on both sides of every split
+        probe = np.random.default_rng(0).uniform(-3, 3, size=(n_probe, n_features))
+        if np.allclose(forest.predict_proba(probe), safe.predict_proba(probe), rtol=0, atol=1e-12):
+            return forest
+        reason = "its predictions differ from the tree arrays"
+    except Exception as e:
+        reason = repr(e)
+    print(f" The scikit-learn rebuild of the artifact is unusable ({reason}); scoring with SafeForest.")
+    return safe
+
+
+def load_artifact(path):
+    """
+    Memory-maps an exported artifact (read-only), validates it and returns (model, preprocessor, header).
+    Safe to use on files from untrusted storage: no code is executed, the layout is validated, and the
+    model is a RandomForestClassifier rebuilt from the tree arrays (scores at scikit-learn speed), or a
+    SafeForest if this scikit-learn version cannot rebuild it exactly.
+    """
+    with open(path, 'rb') as fh:
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a DiabRisk artifact.")
+    (header_length,) = struct.unpack('<I', buffer[len(MAGIC):len(MAGIC) + 4])
+    header_end = len(MAGIC) + 4 + header_length
+    if header_end > len(buffer):
+        raise ValueError("Truncated header.")
+    header = json.loads(bytes(buffer[len(MAGIC) + 4:header_end]))
+    if not isinstance(header, dict) or header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact version: {getattr(header, 'get', lambda _: None)('format_version')}")
+
+    try:
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            if spec['dtype'] not in ALLOWED_DTYPES:
+                raise ValueError(f"Unsupported dtype for '{name}': {spec['dtype']}")
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            if count < 0 or spec['offset'] < header_end or spec['offset'] + count * dtype.itemsize > len(buffer):
+                raise ValueError(f"Array '{name}' lies outside the file.")
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=spec['offset']).reshape(spec['shape'])
+
+        depths = _validate(header, arrays)
+        n_features = len(header['preprocessor']['feature_names_out'])
+        model = _fast_forest(arrays, header['classes'], n_features, depths, header['max_depth'])
+        preprocessor = SafePreprocessor(header['preprocessor'])
+    except (KeyError, TypeError, IndexError) as e:
+        # Missing or wrongly typed header fields: report them like every other malformed file
+        raise ValueError(f"Malformed artifact header: {e!r}") from e
+    return model, preprocessor, header
+
+
+def target_encoder_from_header(header):
+    """Rebuilds the fitted LabelEncoder from the class labels in the header (None if none were exported)."""
+    labels = header.get('class_labels')
+    if labels is None:
+        return None
+    if (not isinstance(labels, list) or len(labels) != len(header['classes'])
+            or not all(isinstance(label, str) for label in labels)):
+        raise ValueError("Invalid class labels in the artifact header.")
+    encoder = LabelEncoder()
+    encoder.classes_ = np.asarray(labels, dtype=object)
+    return encoder
+
+
+def verify_roundtrip(model, preprocessor, path, X: pd.DataFrame):
+    """
+    Compares an exported artifact against the original joblib objects on raw input rows X.
+    Raises AssertionError if the transformed features or the probabilities differ.
+    """
+    safe_model, safe_preprocessor, _ = load_artifact(path)
+
+    expected_features = preprocessor.transform(X)
+    actual_features = safe_preprocessor.transform(X)
+    np.testing.assert_allclose(actual_features, expected_features, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(safe_preprocessor.get_feature_names_out(), preprocessor.get_feature_names_out())
+
+    expected_proba = model.predict_proba(expected_features)
+    actual_proba = safe_model.predict_proba(actual_features)
+    np.testing.assert_allclose(actual_proba, expected_proba, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(safe_model.predict(actual_features), model.predict(expected_features))
+
+    print(f" Round-trip verified on {len(X)} rows: max probability difference "
+          f"{np.abs(actual_proba - expected_proba).max():.2e}")
+    return True
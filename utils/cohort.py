@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from utils.preprocessing import CATEGORICAL_FEATURES, pack_records, unpack_records
+
+
+class CohortTable:
+    """
+    Session-scoped, columnar table of scored patients.
+    Every patient is stored as its packed key (uint32), probability (float32) and threshold decision,
+    so filtering, sorting and aggregating are plain NumPy operations on a few small arrays.
+    Scores are cached per key: adding patients only runs the model for profiles not seen before.
+    """
+
+    def __init__(self, threshold=0.5, capacity=64):
+        self.threshold = threshold
+        self.model_version = None
+        self.size = 0
+        self.total_added = 0  # Running counter for default patient labels (rows can be removed)
+        self.labels = np.empty(capacity, dtype=object)
+        self.keys = np.empty(capacity, dtype=np.uint32)
+        self.probability = np.empty(capacity, dtype=np.float32)
+        self._scores = {}  # packed key -> probability for the current model version
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.keys)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2  # Doubling keeps appends amortized O(1)
+        for name in ('labels', 'keys', 'probability'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _score(self, keys, model, preprocessor):
+        """Returns probabilities for packed keys, calling the model once for the unknown ones only."""
+        unique_keys = np.unique(keys)
+        missing = np.array([key for key in unique_keys.tolist() if key not in self._scores], dtype=np.uint32)
+        if len(missing):
+            proba = model.predict_proba(preprocessor.transform(unpack_records(missing)))[:, 1]
+            self._scores.update(zip(missing.tolist(), proba.tolist()))
+        return np.array([self._scores[key] for key in keys.tolist()], dtype=np.float32)
+
+    def sync_model(self, version, model, preprocessor):
+        """Rescores the table (one call over the unique profiles) when the active model version changes."""
+        if version == self.model_version:
+            return
+        self.model_version = version
+        self._scores = {}
+        if self.size:
+            self.probability[:self.size] = self._score(self.keys[:self.size], model, preprocessor)
+
+    def add(self, X, model, preprocessor, labels=None, probability=None):
+        """
+        Scores and appends raw patient records (DataFrame or dict of columns).
+        Pass `probability` when the records were just scored, to reuse that result.
+        """
+        return self.add_keys(pack_records(X), model, preprocessor, labels, probability)
+
+    def add_keys(self, keys, model, preprocessor, labels=None, probability=None):
+        """Same as add() for already packed records (e.g. the keys returned by validate_records)."""
+        keys = np.asarray(keys, dtype=np.uint32)
+        if probability is None:
+            probability = self._score(keys, model, preprocessor)
+        else:
+            self._scores.update(zip(keys.tolist(), np.asarray(probability, dtype=np.float64).tolist()))
+        if labels is None:
+            labels = [f'Patient {self.total_added + i + 1}' for i in range(len(keys))]
+
+        self._grow(self.size + len(keys))
+        end = self.size + len(keys)
+        self.labels[self.size:end] = labels
+        self.keys[self.size:end] = keys
+        self.probability[self.size:end] = probability
+        self.size = end
+        self.total_added += len(keys)
+        return probability
+
+    def remove(self, rows):
+        """Deletes rows by position."""
+        keep = np.ones(self.size, dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = False
+        n = int(keep.sum())
+        for name in ('labels', 'keys', 'probability'):
+            column = getattr(self, name)
+            column[:n] = column[:self.size][keep]
+        self.size = n
+
+    @property
+    def decision(self):
+        """Threshold decisions, recomputed on the fly (changing the threshold never calls the model)."""
+        return self.probability[:self.size] >= self.threshold
+
+    def symptom_matrix(self):
+        """(n_patients x 14) boolean matrix of symptoms, read straight from the key bits."""
+        bits = np.arange(len(CATEGORICAL_FEATURES), dtype=np.uint32)
+        return ((self.keys[:self.size, None] >> bits) & np.uint32(1)).astype(bool)
+
+    def ages(self):
+        return (self.keys[:self.size] >> np.uint32(len(CATEGORICAL_FEATURES))).astype(np.int64)
+
+    def select(self, only_at_risk=False, min_probability=0.0, symptoms=(), age_range=(0, 200),
+               sort_by='probability', descending=True):
+        """Returns the row positions matching the filters, sorted."""
+        mask = self.probability[:self.size] >= min_probability
+        if only_at_risk:
+            mask &= self.decision
+        ages = self.ages()
+        mask &= (ages >= age_range[0]) & (ages <= age_range[1])
+        if symptoms:
+            required = np.uint32(sum(1 << CATEGORICAL_FEATURES.index(name) for name in symptoms))
+            mask &= (self.keys[:self.size] & required) == required
+
+        rows = np.flatnonzero(mask)
+        order_values = {'probability': self.probability[rows], 'age': ages[rows], 'entry': rows}[sort_by]
+        order = np.argsort(order_values, kind='stable')
+        return rows[order[::-1] if descending else order]
+
+    def to_frame(self, rows=None):
+        """Materializes a DataFrame (only for the rows being displayed or exported)."""
+        if rows is None:
+            rows = np.arange(self.size)
+        frame = unpack_records(self.keys[rows])
+        frame.insert(0, 'Patient', self.labels[rows])
+        frame['Probability'] = self.probability[rows]
+        frame['At Risk'] = self.probability[rows] >= self.threshold
+        frame.index = rows
+        return frame
+
+    def summary(self):
+        """Cohort-level aggregates."""
+        if self.size == 0:
+            return {'patients': 0}
+        decision = self.decision
+        symptoms = self.symptom_matrix()
+        return {
+            'patients': self.size,
+            'at_risk': int(decision.sum()),
+            'mean_probability': float(self.probability[:self.size].mean()),
+            'mean_age': float(self.ages().mean()),
+            'symptom_rate_at_risk': pd.Series(symptoms[decision].mean(axis=0) if decision.any() else 0.0,
+                                              index=CATEGORICAL_FEATURES)
+        }
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from utils.artifacts import SafeForest
+from utils.preprocessing import NUMERICAL_FEATURES, CATEGORICAL_FEATURES, pack_records
+
+FEATURES = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+
+
+def path_contributions(forest: SafeForest, X, positive_class=1):
+    """
+    Per-feature attributions of the positive-class probability (decision-path attribution, as in
+    TreeSHAP's path view): along each tree path, the change in the node's probability is credited
+    to the feature the parent node split on, then averaged over trees.
+    All rows and all trees are walked together, one tree level per step.
+
+    Returns:
+    - bias (float): The forest's average root probability (same for every patient).
+    - contributions (ndarray, n_samples x n_features): bias + row sum == predict_proba[:, positive_class].
+    """
+    X = np.asarray(X, dtype=np.float32)
+    n_samples, n_features = X.shape
+    class_index = int(np.flatnonzero(forest.classes_ == positive_class)[0])
+    value = forest.proba[:, class_index]
+
+    rows = np.arange(n_samples)[:, None]
+    node = np.repeat(forest.roots[None, :], n_samples, axis=0)
+    contributions = np.zeros(n_samples * n_features)
+    for _ in range(forest.max_depth):
+        left = forest.children_left[node]
+        is_split = left != -1
+        if not is_split.any():
+            break
+        feature = forest.feature[node]
+        go_left = X[rows, feature] <= forest.threshold[node]
+        child = np.where(is_split, np.where(go_left, left, forest.children_right[node]), node)
+
+        # Credit the probability change to the split feature of each (row, tree) still inside the tree
+        delta = (value[child] - value[node])[is_split]
+        slot = (np.broadcast_to(rows, node.shape) * n_features + feature)[is_split]
+        contributions += np.bincount(slot, weights=delta, minlength=n_samples * n_features)
+        node = child
+
+    bias = float(value[forest.roots].mean())
+    return bias, contributions.reshape(n_samples, n_features) / forest.n_estimators
+
+
+class ExplanationCache:
+    """
+    Batched, cached explanations for one model version.
+    The input space is finite (Age x 14 Yes/No symptoms), so results are cached by the packed
+    patient key: repeated profiles are never recomputed and a batch only computes its new unique keys.
+    """
+
+    def __init__(self, model, preprocessor, max_entries=100_000):
+        self.forest = model if isinstance(model, SafeForest) else SafeForest.from_model(model)
+        self.preprocessor = preprocessor
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # key -> contributions (float32), least recently used first
+        self._lock = threading.Lock()
+        positive = int(np.flatnonzero(self.forest.classes_ == 1)[0])
+        self.bias = float(self.forest.proba[self.forest.roots, positive].mean())  # Score before any split
+
+    def explain(self, X: pd.DataFrame):
+        """Returns the (n_samples x 15) contribution matrix for raw input records, in FEATURES order."""
+        X = pd.DataFrame(X)
+        keys = pack_records(X)
+        unique_keys, first_row, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        result = np.empty((len(unique_keys), len(FEATURES)), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(unique_keys.tolist()):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    result[i] = cached
+
+        if missing:
+            # One vectorized pass over all new profiles of the batch
+            new_rows = X.iloc[first_row[missing]]
+            _, contributions = path_contributions(self.forest, self.preprocessor.transform(new_rows))
+            result[missing] = contributions
+
+            with self._lock:
+                for i in missing:
+                    self._cache[int(unique_keys[i])] = result[i].copy()
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        return result[inverse.ravel()]
+
+    def explain_dataframe(self, X: pd.DataFrame):
+        """Batch output: one 'contrib: <feature>' column per feature plus the base value."""
+        X = pd.DataFrame(X)
+        contributions = self.explain(X)
+        output = pd.DataFrame(contributions, columns=[f'contrib: {name}' for name in FEATURES],
+                              index=X.index)
+        output.insert(0, 'base_value', self.bias)
+        return output
+
+
+def top_reasons(contributions, record, n=3):
+    """
+    Returns the `n` strongest drivers of one patient's score as (label, contribution) pairs,
+    e.g. ('Polyuria = Yes', +0.21).
+    """
+    order = np.argsort(-np.abs(contributions))[:n]
+    return [(f"{FEATURES[i]} = {np.asarray(record[FEATURES[i]]).ravel()[0]}", float(contributions[i])) for i in order]
@@ -0,0 +1,139 @@
+import glob
+import os
+import re
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import recall_score
+
+from utils.preprocessing import hash_split
+from utils.registry import current_version, list_versions, load_bundle, publish_bundle
+from utils.tracking import active_run, track_stage
+
+
+def update_scaler(preprocessor, X_new: pd.DataFrame, forest=None):
+    """
+    Updates the 'Age' StandardScaler with new data from its running sums (partial_fit), without refitting.
+    If a fitted forest is given, its Age split thresholds are moved to the new scale so the existing
+    trees keep making exactly the same decisions for every whole-year age.
+    """
+    scaler = preprocessor.named_transformers_['num']
+    old_mean, old_scale = scaler.mean_.copy(), scaler.scale_.copy()
+
+    scaler.partial_fit(X_new[list(scaler.feature_names_in_)])  # Merges the new mean/variance into the old ones
+
+    if forest is not None:
+        for column, feature_name in enumerate(scaler.feature_names_in_):
+            # Position of this scaled column in the preprocessor output
+            feature_index = list(preprocessor.get_feature_names_out()).index(f'num__{feature_name}')
+            for tree in forest.estimators_:
+                threshold = tree.tree_.threshold  # Writable view on the tree's node array
+                is_split = tree.tree_.feature == feature_index
+                old_threshold = threshold[is_split]
+
+                # Age is recorded in whole years: find on which side the nearest age went in the old tree
+                # (trees compare float32 inputs), then put the new threshold half a year away from it
+                nearest_age = np.round(old_threshold * old_scale[column] + old_mean[column])
+                old_input = ((nearest_age - old_mean[column]) / old_scale[column]).astype(np.float32)
+                boundary = np.where(old_input <= old_threshold, nearest_age + 0.5, nearest_age - 0.5)
+                threshold[is_split] = (boundary - scaler.mean_[column]) / scaler.scale_[column]
+
+    return preprocessor
+
+
+def add_trees(forest: RandomForestClassifier, X_new, y_new, version, n_new_trees=20, max_trees=100):
+    """
+    Grows `n_new_trees` extra trees on the new data only (warm_start) and retires the oldest trees
+    so that the forest never holds more than `max_trees`.
+    The version each tree was trained in is kept in `forest.tree_versions_`.
+    """
+    if not isinstance(forest, RandomForestClassifier):
+        raise TypeError(f"Incremental training needs a RandomForestClassifier, got {type(forest).__name__}.")
+    if len(np.unique(y_new)) < len(forest.classes_):
+        raise ValueError("The new data must contain every class (Positive and Negative) to grow new trees.")
+
+    # Trees of the original model count as version 0
+    tree_versions = list(getattr(forest, 'tree_versions_', [0] * len(forest.estimators_)))
+
+    # 1. Grow new trees on the new data only
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + n_new_trees)
+    forest.fit(X_new, y_new)
+    tree_versions += [version] * n_new_trees
+
+    # 2. Retire the oldest trees
+    n_retired = max(0, len(forest.estimators_) - max_trees)
+    forest.estimators_ = forest.estimators_[n_retired:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    forest.tree_versions_ = tree_versions[n_retired:]
+
+    print(f" Added {n_new_trees} trees, retired {n_retired}. Forest size: {len(forest.estimators_)}")
+    return forest
+
+
+def next_version(model_dir='../models'):
+    """
+    Returns the next free version number. It is shared by the 'best_model_vXXX.joblib' files in model_dir
+    and the registry versions in model_dir/registry, so 'best_model_v007.joblib' is always registry 'v007'.
+    """
+    versions = [int(re.search(r'_v(\d+)\.joblib$', path).group(1))
+                for path in glob.glob(os.path.join(model_dir, 'best_model_v*.joblib'))]
+    versions += [int(version[1:]) for version in list_versions(os.path.join(model_dir, 'registry'))]
+    return max(versions, default=0) + 1
+
+
+def incremental_update(df_new: pd.DataFrame, target_column='class', model_dir='../models',
+                       n_new_trees=20, max_trees=100, promote=True):
+    """
+    Refreshes the deployed artifacts with a new labeled data drop, without a full rebuild.
+    The update starts from the active registry version (model_dir/registry/CURRENT), so a rollback with
+    set_current() is respected; without a registry it starts from the unversioned files in model_dir.
+    0. Splits the drop with hash_split: only its Training rows are learned from, its Validation rows
+       measure the updated model, and its Test rows stay untouched (the same rows as in a full rebuild).
+    1. Updates the Age scaler statistics (the OneHotEncoder is kept, the Yes/No categories don't change).
+    2. Adds new trees trained on the new rows only and retires the oldest ones.
+    3. Saves the result as 'best_model_vXXX.joblib' / 'preprocessor_vXXX.joblib' next to the current files.
+       With promote=True the unversioned files are replaced as well and the bundle is published to
+       the model registry (models/registry) as the same version 'vXXX', where the running App picks it
+       up without a restart.
+
+    Returns:
+    - version (int): The version number that was saved.
+    """
+    registry_dir = os.path.join(model_dir, 'registry')
+    base_version = current_version(registry_dir)
+    if base_version is not None:
+        # Our own training artifacts (hash-checked): the scikit-learn objects are needed to keep training
+        _, model, preprocessor, label_encoder = load_bundle(base_version, registry_dir, allow_pickle=True)
+    else:
+        model = joblib.load(os.path.join(model_dir, 'best_model.joblib'))
+        preprocessor = joblib.load(os.path.join(model_dir, 'preprocessor.joblib'))
+        label_encoder = joblib.load(os.path.join(model_dir, 'target_encoder.joblib'))
+
+    X_new, X_val, _, y_new, y_val, _ = hash_split(df_new, target_column)
+    y_new = label_encoder.transform(y_new)
+    version = next_version(model_dir)
+
+    run = active_run()
+    if run is not None:
+        run.log_data(f'incremental_v{version:03d}', df_new)
+    with track_stage('incremental_update'):
+        update_scaler(preprocessor, X_new, forest=model)
+        add_trees(model, preprocessor.transform(X_new), y_new, version, n_new_trees, max_trees)
+
+    if len(X_val):
+        val_recall = recall_score(label_encoder.transform(y_val), model.predict(preprocessor.transform(X_val)))
+        print(f" Recall on the {len(X_val)} new Validation rows: {val_recall:.3f}")
+        if run is not None:
+            run.log_metrics({'val_recall': val_recall}, stage='incremental_update')
+
+    joblib.dump(model, os.path.join(model_dir, f'best_model_v{version:03d}.joblib'))
+    joblib.dump(preprocessor, os.path.join(model_dir, f'preprocessor_v{version:03d}.joblib'))
+    if promote:
+        joblib.dump(model, os.path.join(model_dir, 'best_model.joblib'))
+        joblib.dump(preprocessor, os.path.join(model_dir, 'preprocessor.joblib'))
+        publish_bundle(model, preprocessor, label_encoder, registry_dir=registry_dir, version=f'v{version:03d}',
+                       notes=f"incremental update of {base_version or 'the unversioned files'}")
+
+    print(f" Saved version {version:03d} to {model_dir}")
+    return version
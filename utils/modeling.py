@@ -0,0 +1,110 @@
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import recall_score
+from xgboost import XGBClassifier
+
+from utils.tracking import active_run, track_stage
+
+
+def to_compact_matrix(X: pd.DataFrame):
+    """
+    Converts the processed feature matrix into its compact training form.
+    - Age stays a (scaled) float32 column.
+    - Every One-Hot symptom column becomes uint8 (the values are exactly 0/1).
+    """
+    X_compact = pd.DataFrame(X).copy()
+    for column in X_compact.columns:
+        if column == 'Age':
+            X_compact[column] = X_compact[column].astype(np.float32)
+        else:
+            X_compact[column] = X_compact[column].astype(np.uint8)
+    return X_compact
+
+
+def train_xgboost(X_train, y_train, X_val, y_val, n_estimators=500, early_stopping_rounds=20, random_state=42):
+    """
+    Trains a histogram-based XGBoost classifier with early stopping on the validation split.
+
+    Returns:
+    - model (XGBClassifier): The fitted booster (best iteration is used for predictions).
+    """
+    model = XGBClassifier(
+        n_estimators=n_estimators,          # Upper bound, early stopping picks the real number of rounds
+        tree_method='hist',                 # Bins features once, then builds trees on the histograms
+        max_depth=4,                        # Shallow trees are enough for 15 mostly binary features
+        learning_rate=0.1,
+        eval_metric='logloss',
+        early_stopping_rounds=early_stopping_rounds,
+        random_state=random_state,
+        n_jobs=-1
+    )
+    with track_stage('xgboost_fit'):
+        model.fit(
+            to_compact_matrix(X_train), y_train,
+            eval_set=[(to_compact_matrix(X_val), y_val)],  # Stop when the validation loss stops improving
+            verbose=False
+        )
+    run = active_run()
+    if run is not None:
+        run.log_metrics({'best_iteration': model.best_iteration + 1}, stage='xgboost_fit')
+    print(f" XGBoost stopped at round {model.best_iteration + 1} of {n_estimators}.")
+
+    return model
+
+
+def benchmark_models(models: dict, X_train, y_train, X_val, y_val, scale=1, repeats=5):
+    """
+    Compares models head-to-head on fit time, predict latency and recall.
+    - scale > 1 tiles the training/validation rows to measure how training and scoring grow with data size.
+    - Predict latency is measured on a single row (the app's use case) and on the whole validation set.
+
+    Returns:
+    - results_df (DataFrame): One row per model.
+    """
+    X_train_big = pd.concat([X_train] * scale, ignore_index=True)
+    y_train_big = np.tile(np.asarray(y_train), scale)
+    X_val_big = pd.concat([X_val] * scale, ignore_index=True)
+
+    results = []
+    for name, model in models.items():
+        # 1. Fit time (XGBoost models get the early stopping split as well)
+        start = time.perf_counter()
+        if isinstance(model, XGBClassifier):
+            model.fit(to_compact_matrix(X_train_big), y_train_big,
+                      eval_set=[(to_compact_matrix(X_val), y_val)], verbose=False)
+        else:
+            model.fit(X_train_big, y_train_big)
+        fit_time = time.perf_counter() - start
+
+        # 2. Predict latency: best of `repeats` to hide warm-up noise
+        single_row = X_val.iloc[[0]]
+        single_times, batch_times = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict_proba(single_row)
+            single_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            model.predict_proba(X_val_big)
+            batch_times.append(time.perf_counter() - start)
+
+        # 3. Recall on the (un-tiled) validation set
+        rec = recall_score(y_val, model.predict(X_val))
+
+        results.append({
+            "Model": name,
+            "Train Rows": len(X_train_big),
+            "Fit Time (s)": fit_time,
+            "Single Predict (ms)": min(single_times) * 1000,
+            "Batch Predict (ms)": min(batch_times) * 1000,
+            "Recall": rec
+        })
+
+    run = active_run()
+    if run is not None:
+        for row in results:
+            run.log_metrics({k: v for k, v in row.items() if k != 'Model'},
+                            stage=f"benchmark_x{scale}.{row['Model']}")
+
+    return pd.DataFrame(results)
@@ -0,0 +1,203 @@
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('diabrisk.drift')
+
+# Fixed Age bins (years) shared by the training reference and the live window
+AGE_BINS = [0, 30, 40, 50, 60, 70, 200]
+EPS = 1e-4  # Smoothing for empty bins in PSI / KL
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Sends the 'diabrisk.*' log records (drift metrics and alerts) to stderr. Without it Python only shows
+    warnings, so the periodic metrics would be dropped. Safe to call more than once.
+    """
+    parent = logging.getLogger('diabrisk')
+    if not parent.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        parent.addHandler(handler)
+        parent.propagate = False  # Don't print every record twice if the root logger is configured too
+    parent.setLevel(level)
+    return parent
+
+
+def reference_stats(X: pd.DataFrame, categorical_features=None):
+    """
+    Captures the training distribution used as drift reference (raw features, before preprocessing):
+    - Age mean/std and its share per AGE_BINS bin.
+    - 'Yes' rate of every symptom.
+    """
+    if categorical_features is None:
+        categorical_features = [column for column in X.columns if column != 'Age']
+
+    age = X['Age'].to_numpy(dtype=np.float64)
+    age_counts = np.histogram(age, bins=AGE_BINS)[0]
+
+    return {
+        'n': int(len(X)),
+        'age_mean': float(age.mean()),
+        'age_std': float(age.std()),
+        'age_bins': AGE_BINS,
+        'age_dist': (age_counts / age_counts.sum()).tolist(),
+        'symptom_rates': {column: float((X[column] == 'Yes').mean()) for column in categorical_features}
+    }
+
+
+def save_reference_stats(stats, path='../models/drift_reference.json'):
+    """Saves the reference statistics next to the model artifacts."""
+    with open(path, 'w') as fh:
+        json.dump(stats, fh, indent=2)
+
+
+def load_reference_stats(path='models/drift_reference.json'):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def psi(expected, actual):
+    """Population Stability Index between two discrete distributions (< 0.1 stable, > 0.25 major shift)."""
+    expected = np.clip(np.asarray(expected, dtype=np.float64), EPS, None)
+    actual = np.clip(np.asarray(actual, dtype=np.float64), EPS, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected), axis=-1))
+
+
+def kl_divergence(expected, actual):
+    """KL(actual || expected) between two discrete distributions."""
+    expected = np.clip(np.asarray(expected, dtype=np.float64), EPS, None)
+    actual = np.clip(np.asarray(actual, dtype=np.float64), EPS, None)
+    return float(np.sum(actual * np.log(actual / expected), axis=-1))
+
+
+class DriftMonitor:
+    """
+    Online input-drift monitor for the scoring path. Memory is constant: no raw request is stored.
+    - Age: running mean/variance since start (Welford) plus a binned histogram per window bucket.
+    - Symptoms: 'Yes' counters per window bucket.
+    - The sliding window is a ring of `n_buckets` buckets of `bucket_size` records each.
+    Metrics (PSI / KL against the training reference) are logged every `emit_every` records, tagged with
+    `name` when several monitors run side by side (e.g. one per hospital region).
+    """
+
+    def __init__(self, reference, n_buckets=10, bucket_size=100, emit_every=100, psi_alert=0.25, name=None):
+        self.reference = reference
+        self.name = name
+        self.symptoms = list(reference['symptom_rates'])
+        self.age_bins = np.asarray(reference['age_bins'], dtype=np.float64)
+        self.ref_age_dist = np.asarray(reference['age_dist'])
+        self.ref_rates = np.array([reference['symptom_rates'][name] for name in self.symptoms])
+        self.bucket_size = bucket_size
+        self.emit_every = emit_every
+        self.psi_alert = psi_alert
+
+        # Welford accumulators for Age (all traffic since start)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        # Ring buffer of window buckets
+        self.bucket_n = np.zeros(n_buckets, dtype=np.int64)
+        self.bucket_age = np.zeros((n_buckets, len(self.age_bins) - 1), dtype=np.int64)
+        self.bucket_yes = np.zeros((n_buckets, len(self.symptoms)), dtype=np.int64)
+        self.current = 0
+        self._since_emit = 0
+        self._lock = threading.Lock()  # The App serves several sessions from threads
+
+    def update(self, X):
+        """
+        Adds a batch of raw records: a DataFrame, or a dict of columns (e.g. the App's input dict),
+        which skips the pandas overhead on the single-record path.
+        """
+        age = np.asarray(X['Age'], dtype=np.float64)
+        n = len(age)
+        if n == 0:
+            return
+        n_age_bins = len(self.age_bins) - 1
+        age_bin = np.clip(np.searchsorted(self.age_bins, age, side='right') - 1, 0, n_age_bins - 1)
+        is_yes = np.column_stack([np.asarray(X[name]) == 'Yes' for name in self.symptoms])
+
+        with self._lock:
+            # Chan et al. parallel form of Welford: merges the batch mean/variance in one step
+            batch_mean = age.mean()
+            batch_m2 = ((age - batch_mean) ** 2).sum()
+            total = self.count + n
+            delta = batch_mean - self.mean
+            self.mean += delta * n / total
+            self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+            self.count = total
+
+            # Spread the batch over the window buckets, bucket_size records each. Rows older than one
+            # full window would be overwritten anyway, so only the last n_buckets * bucket_size are binned.
+            start = max(0, n - len(self.bucket_n) * self.bucket_size)
+            while start < n:
+                # Start a new bucket (dropping the oldest one) when the current one is full
+                if self.bucket_n[self.current] >= self.bucket_size:
+                    self.current = (self.current + 1) % len(self.bucket_n)
+                    self.bucket_n[self.current] = 0
+                    self.bucket_age[self.current] = 0
+                    self.bucket_yes[self.current] = 0
+                end = min(n, start + self.bucket_size - self.bucket_n[self.current])
+                self.bucket_n[self.current] += end - start
+                self.bucket_age[self.current] += np.bincount(age_bin[start:end], minlength=n_age_bins)
+                self.bucket_yes[self.current] += is_yes[start:end].sum(axis=0)
+                start = end
+
+            self._since_emit += n
+            emit = self._since_emit >= self.emit_every
+            if emit:
+                self._since_emit = 0
+
+        if emit:
+            self.emit()
+
+    def metrics(self):
+        """Returns the current drift metrics of the sliding window against the training reference."""
+        with self._lock:
+            window_n = int(self.bucket_n.sum())
+            age_counts = self.bucket_age.sum(axis=0)
+            yes_counts = self.bucket_yes.sum(axis=0)
+            count, mean, m2 = self.count, self.mean, self.m2
+
+        result = {
+            'records_total': count,
+            'records_window': window_n,
+            'age_mean': mean,
+            'age_std': float(np.sqrt(m2 / count)) if count else 0.0,
+            'age_mean_shift_std': (mean - self.reference['age_mean']) / self.reference['age_std'] if count else 0.0
+        }
+        if window_n == 0:
+            return result
+
+        age_dist = age_counts / window_n
+        rates = yes_counts / window_n
+        result['age_psi'] = psi(self.ref_age_dist, age_dist)
+        result['age_kl'] = kl_divergence(self.ref_age_dist, age_dist)
+        # Each symptom is a Yes/No distribution
+        result['symptom_psi'] = {
+            name: psi([1 - ref, ref], [1 - rate, rate])
+            for name, ref, rate in zip(self.symptoms, self.ref_rates, rates)
+        }
+        result['symptom_rates'] = dict(zip(self.symptoms, rates.round(4).tolist()))
+        return result
+
+    def alerts(self, metrics=None):
+        """Lists the features whose window PSI is above `psi_alert`."""
+        metrics = metrics or self.metrics()
+        drifted = [name for name, value in metrics.get('symptom_psi', {}).items() if value > self.psi_alert]
+        if metrics.get('age_psi', 0.0) > self.psi_alert:
+            drifted.insert(0, 'Age')
+        return drifted
+
+    def emit(self):
+        """Logs the metrics (and a warning for drifted features)."""
+        metrics = self.metrics()
+        tag = f" [{self.name}]" if self.name is not None else ""
+        logger.info("drift metrics%s: %s", tag, json.dumps(metrics))
+        drifted = self.alerts(metrics)
+        if drifted:
+            logger.warning("input drift detected%s (PSI > %.2f) for: %s", tag, self.psi_alert, ', '.join(drifted))
+        return metrics
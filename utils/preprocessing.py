@@ -6,6 +6,18 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
 from sklearn.compose import ColumnTransformer
 
+from utils.tracking import active_run
+
+NUMERICAL_FEATURES = ['Age']
+
+# All categorical columns from the UCI Dataset (Gender is removed to prevent bias)
+CATEGORICAL_FEATURES = [
+    'Polyuria', 'Polydipsia', 'sudden weight loss',
+    'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring',
+    'Itching', 'Irritability', 'delayed healing', 'partial paresis',
+    'muscle stiffness', 'Alopecia', 'Obesity'
+]
+
 def clean_duplicates(df: pd.DataFrame):
     """
     Drops duplicate rows from the DataFrame and returns the clean version.
@@ -66,6 +78,161 @@ def split_data(df, target_column='class', test_size=0.2, val_size=0.2, random_st
     
     return X_train, X_val, X_test, y_train, y_val, y_test
 
+# 16-byte key for pd.util.hash_pandas_object. Changing it reshuffles every hash-based split.
+HASH_KEY = 'diabrisk-split-1'
+
+def _canonical_frame(df: pd.DataFrame):
+    """
+    Canonical form of the rows used for hashing, so the hash only depends on the values:
+    - Fixed column order (Age, the 14 symptoms, then any other columns by name).
+    - Age as int64 (a float Age column, e.g. caused by a blank cell, hashes the same as an int one).
+    - Every other column as stripped Python strings (missing values -> '').
+    """
+    known = [c for c in NUMERICAL_FEATURES + CATEGORICAL_FEATURES if c in df.columns]
+    columns = known + sorted(c for c in df.columns if c not in known)
+    data = {}
+    for column in columns:
+        if column in NUMERICAL_FEATURES:
+            values = pd.to_numeric(df[column], errors='coerce').round()
+            data[column] = values.fillna(-1).to_numpy(dtype=np.int64)
+        else:
+            values = df[column].astype('string').str.strip().fillna('')
+            data[column] = values.to_numpy(dtype=object)
+    return pd.DataFrame(data)
+
+def hash_rows(df: pd.DataFrame, hash_key=HASH_KEY):
+    """
+    Returns a deterministic uint64 content hash for every row (the index is ignored).
+    Identical rows always get the same hash, on any machine and in any data drop, whatever the
+    column order or dtypes the file was read with (see _canonical_frame).
+    """
+    return pd.util.hash_pandas_object(_canonical_frame(df), index=False, hash_key=hash_key).to_numpy()
+
+def _hash_to_unit(X: pd.DataFrame, hash_key=HASH_KEY):
+    """Turns the row hash into a uniform number in [0, 1)."""
+    return (hash_rows(X, hash_key) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def assign_hash_split(X: pd.DataFrame, test_size=0.2, val_size=0.2, hash_key=HASH_KEY):
+    """
+    Maps every row to 'train', 'val' or 'test' from the hash of its feature values only.
+    - Identical patients (even with conflicting labels) always land in the same split.
+    - The cut-points are fixed (not taken from the data), so a row's split depends on nothing but its own
+      values: it never changes when new data is appended, and a held-out row never becomes training data.
+    - The hash is independent of the label, so every class is split 60/20/20 in expectation.
+    """
+    u = _hash_to_unit(X, hash_key)
+    return np.where(u < 1 - (test_size + val_size), 'train', np.where(u < 1 - test_size, 'val', 'test'))
+
+class HashIndex:
+    """
+    Set of uint64 row hashes for streaming de-duplication, stored as a few sorted NumPy runs.
+    - contains() is a binary search per run (no Python objects per row).
+    - add() merges runs like a binary counter, so each hash is re-sorted only O(log n) times in total.
+    Save it between runs with np.save(path, index.to_array()) and reload it with HashIndex(np.load(path)).
+    """
+
+    def __init__(self, hashes=()):
+        self.runs = []
+        self.add(np.asarray(hashes, dtype=np.uint64))
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[positions] == hashes
+        return found
+
+    def add(self, hashes):
+        run = np.unique(np.asarray(hashes, dtype=np.uint64))
+        if not len(run):
+            return
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.union1d(self.runs.pop(), run)
+        self.runs.append(run)
+
+    def to_array(self):
+        return np.concatenate(self.runs) if self.runs else np.empty(0, dtype=np.uint64)
+
+def _drop_seen(chunk: pd.DataFrame, seen_hashes: HashIndex, hash_key=HASH_KEY):
+    """Drops exact duplicates (features + label) within the chunk and against everything seen so far."""
+    row_hashes = hash_rows(chunk, hash_key)
+    is_new = ~pd.Series(row_hashes).duplicated().to_numpy()
+    is_new &= ~seen_hashes.contains(row_hashes)
+    seen_hashes.add(row_hashes[is_new])
+    return chunk[is_new]
+
+def iter_hash_split(chunks, target_column='class', test_size=0.2, val_size=0.2, seen_hashes=None, hash_key=HASH_KEY):
+    """
+    Streaming version of hash_split: splits and de-duplicates an iterable of DataFrame chunks in one pass
+    (e.g. pd.read_csv(path, chunksize=...), or only the newest weekly data drop).
+    - seen_hashes (HashIndex): Full-row hashes already processed. Pass the index from the previous run to
+      continue incrementally; it is updated in place and only holds 8-byte hashes, never raw rows.
+    - Rows get exactly the same split as with hash_split, whatever the chunking.
+
+    Yields:
+    - (split_name, X_chunk, y_chunk) for every non-empty split of every chunk.
+    """
+    if seen_hashes is None:
+        seen_hashes = HashIndex()
+
+    for chunk in chunks:
+        # 1. Drop exact duplicates (features + label) against everything seen so far
+        chunk = _drop_seen(chunk, seen_hashes, hash_key)
+
+        # 2. Assign each remaining row to its split
+        X = chunk.drop(columns=[target_column])
+        y = chunk[target_column]
+        splits = assign_hash_split(X, test_size, val_size, hash_key=hash_key)
+
+        for name in ('train', 'val', 'test'):
+            mask = splits == name
+            if mask.any():
+                yield name, X[mask], y[mask]
+
+def hash_split(df, target_column='class', test_size=0.2, val_size=0.2, hash_key=HASH_KEY):
+    """
+    Leakage-safe, stable split: Train (60%), Validation (20%), Test (20%) by row content hash (see
+    assign_hash_split). Exact duplicates are removed as part of the split, so clean_duplicates is not
+    needed first, and a row keeps its split in every later run on a larger dataset.
+
+    Returns:
+    - X_train, X_val, X_test (DataFrames)
+    - y_train, y_val, y_test (Series)
+    """
+    df = _drop_seen(df, HashIndex(), hash_key)
+    X = df.drop(columns=[target_column])
+    y = df[target_column]
+    splits = assign_hash_split(X, test_size, val_size, hash_key=hash_key)
+
+    result = [X[splits == name] for name in ('train', 'val', 'test')]
+    result += [y[splits == name] for name in ('train', 'val', 'test')]
+
+    print(f" Hash split -> Train: {len(result[0])} | Val: {len(result[1])} | Test: {len(result[2])}")
+    return tuple(result)
+
+def pack_records(X):
+    """
+    Packs every patient into one uint32 key: Age in the high bits, one bit per symptom ('Yes' = 1).
+    Identical profiles get identical keys, which makes them cheap to cache, compare and store.
+    Accepts a DataFrame or a dict of columns with the raw feature values.
+    """
+    age = np.asarray(X['Age']).astype(np.uint32)
+    key = age << np.uint32(len(CATEGORICAL_FEATURES))
+    for bit, name in enumerate(CATEGORICAL_FEATURES):
+        key |= (np.asarray(X[name]) == 'Yes').astype(np.uint32) << np.uint32(bit)
+    return key
+
+def unpack_records(keys):
+    """Rebuilds the raw feature DataFrame from keys created by pack_records."""
+    keys = np.asarray(keys, dtype=np.uint32)
+    data = {'Age': (keys >> np.uint32(len(CATEGORICAL_FEATURES))).astype(np.int64)}
+    for bit, name in enumerate(CATEGORICAL_FEATURES):
+        data[name] = np.where((keys >> np.uint32(bit)) & np.uint32(1), 'Yes', 'No')
+    return pd.DataFrame(data)
+
 def create_preprocessor():
     """
     Creates and returns a Scikit-Learn ColumnTransformer.
@@ -73,15 +240,8 @@ def create_preprocessor():
     - Applies OneHotEncoder to all Categorical symptoms.
     """
     # 1. Define Features
-    numerical_features = ['Age']
-    
-    # All categorical columns from the UCI Dataset
-    categorical_features = [
-        'Polyuria', 'Polydipsia', 'sudden weight loss',
-        'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring',
-        'Itching', 'Irritability', 'delayed healing', 'partial paresis',
-        'muscle stiffness', 'Alopecia', 'Obesity'
-    ]
+    numerical_features = NUMERICAL_FEATURES
+    categorical_features = CATEGORICAL_FEATURES
     
     # 2. Create Transformers
     numerical_transformer = StandardScaler()
@@ -134,5 +294,13 @@ def save_artifacts(X_train, X_val, X_test, y_train, y_val, y_test, preprocessor,
     # Save Artifacts
     joblib.dump(preprocessor, '../models/preprocessor.joblib')# saves the preprocessor object to a file named 'preprocessor.joblib' in the '../models/' directory.
     joblib.dump(label_encoder, '../models/target_encoder.joblib')
+
+    # Record the exact splits and artifacts in the active experiment run (if any)
+    run = active_run()
+    if run is not None:
+        for name, X in (('X_train', X_train), ('X_val', X_val), ('X_test', X_test)):
+            run.log_data(name, X)
+        run.log_artifact('../models/preprocessor.joblib')
+        run.log_artifact('../models/target_encoder.joblib')
     
     print(" All files and models saved successfully!")
\ No newline at end of file
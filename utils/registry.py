@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+
+from utils.artifacts import export_artifact, load_artifact, target_encoder_from_header
+from utils.tracking import active_run
+
+# One immutable, consistent set of artifacts. The App always reads model and preprocessor from the
+# same bundle object, so a request can never see a new model with an old preprocessor.
+ModelBundle = namedtuple('ModelBundle', ['version', 'model', 'preprocessor', 'target_encoder'])
+
+ARTIFACTS = ('best_model', 'preprocessor', 'target_encoder')
+SAFE_ARTIFACT = 'model.bin'  # Pickle-free export (utils/artifacts.py), the file the App and the router serve
+
+
+def file_sha256(path):
+    """Returns the SHA-256 hex digest of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write_text(path, text):
+    """Writes a small text file so that readers see either the old or the new content, never a mix."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(text)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+def list_versions(registry_dir='../models/registry'):
+    """Returns the published versions ('v001', 'v002', ...) in order."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if name.startswith('v') and os.path.isfile(os.path.join(registry_dir, name, 'manifest.json')))
+
+
+def current_version(registry_dir='../models/registry'):
+    """Returns the active version from the CURRENT pointer file, or None if nothing is published."""
+    try:
+        with open(os.path.join(registry_dir, 'CURRENT')) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, registry_dir='../models/registry'):
+    """Activates a published version (also used for rollbacks) by atomically replacing the CURRENT pointer."""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f"Unknown model version: {version}")
+    _atomic_write_text(os.path.join(registry_dir, 'CURRENT'), version + '\n')
+
+
+def publish_bundle(model, preprocessor, target_encoder, registry_dir='../models/registry', activate=True, notes='',
+                   version=None):
+    """
+    Stores a versioned bundle (best_model / preprocessor / target_encoder) in the registry:
+    - model.bin: the pickle-free artifact (Random Forest models), which is what load_bundle serves.
+    - The joblib files, kept for training code only (e.g. as the base of an incremental update); they are
+      unpickled only when load_bundle is called with allow_pickle=True.
+    - Files are written to a hidden temporary folder, hashed, then renamed into place in one step.
+    - manifest.json records the version, creation time and the SHA-256 of every file.
+    - With activate=True the CURRENT pointer is switched to the new version.
+    - version (str, optional): Publishes under this version (e.g. 'v007') instead of the next free one.
+
+    Returns:
+    - version (str): e.g. 'v004'.
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    existing = list_versions(registry_dir)
+    if version is None:
+        version = f"v{(int(existing[-1][1:]) if existing else 0) + 1:03d}"
+    elif os.path.exists(os.path.join(registry_dir, version)):
+        raise ValueError(f"Model version {version} is already published.")
+
+    staging_dir = tempfile.mkdtemp(dir=registry_dir, prefix='.staging-')
+    try:
+        files = {}
+        try:
+            path = export_artifact(model, preprocessor, os.path.join(staging_dir, SAFE_ARTIFACT), target_encoder)
+            files['artifact'] = {'file': SAFE_ARTIFACT, 'sha256': file_sha256(path)}
+        except (TypeError, ValueError) as e:
+            print(f" No pickle-free artifact for this model ({e}): it can only be loaded with allow_pickle=True.")
+
+        for name, obj in zip(ARTIFACTS, (model, preprocessor, target_encoder)):
+            path = os.path.join(staging_dir, f'{name}.joblib')
+            joblib.dump(obj, path)
+            files[name] = {'file': f'{name}.joblib', 'sha256': file_sha256(path)}
+
+        manifest = {
+            'version': version,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'model_type': type(model).__name__,
+            'files': files,
+            'notes': notes
+        }
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+
+        os.rename(staging_dir, os.path.join(registry_dir, version))  # The version appears complete or not at all
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        set_current(version, registry_dir)
+
+    run = active_run()
+    if run is not None:
+        for entry in files.values():
+            path = os.path.join(registry_dir, version, entry['file'])
+            run.log_artifact(path, entry['sha256'])
+
+    print(f" Published model bundle {version} to {registry_dir}")
+    return version
+
+
+def _checked_path(version_dir, entry):
+    """Path of a manifest entry, after checking the file against its SHA-256."""
+    if os.path.basename(entry['file']) != entry['file']:
+        raise ValueError(f"Invalid file name in the manifest: {entry['file']}")
+    path = os.path.join(version_dir, entry['file'])
+    if file_sha256(path) != entry['sha256']:
+        raise ValueError(f"Hash mismatch for {path}: the file was modified after publishing.")
+    return path
+
+
+def load_bundle(version, registry_dir='../models/registry', allow_pickle=False):
+    """
+    Loads a version and checks every file it reads against the hashes in its manifest.
+    - By default only the pickle-free artifact (model.bin) is loaded: no code from storage is executed.
+    - allow_pickle=True loads the joblib files instead (the original scikit-learn objects, needed for
+      retraining and for models without an artifact, e.g. XGBoost). Only use it on trusted storage.
+    """
+    version_dir = os.path.join(registry_dir, version)
+    with open(os.path.join(version_dir, 'manifest.json')) as fh:
+        manifest = json.load(fh)
+
+    if not allow_pickle:
+        if 'artifact' not in manifest['files']:
+            raise ValueError(f"Version {version} ({manifest.get('model_type')}) has no pickle-free artifact; "
+                             "load it with allow_pickle=True from trusted storage only.")
+        model, preprocessor, header = load_artifact(_checked_path(version_dir, manifest['files']['artifact']))
+        return ModelBundle(version, model, preprocessor, target_encoder_from_header(header))
+
+    objects = [joblib.load(_checked_path(version_dir, manifest['files'][name])) for name in ARTIFACTS]
+    return ModelBundle(version, *objects)
+
+
+def warm_up(bundle: ModelBundle):
+    """Runs one dummy prediction so that the first real request doesn't pay for lazy initialization."""
+    columns = list(bundle.preprocessor.feature_names_in_)
+    dummy = pd.DataFrame([{column: 40 if column == 'Age' else 'No' for column in columns}])
+    bundle.model.predict_proba(bundle.preprocessor.transform(dummy))
+    return bundle
+
+
+class RegistryWatcher:
+    """
+    Keeps the active model bundle in memory and hot-swaps it when the registry's CURRENT pointer changes.
+    - A background thread polls CURRENT every `interval` seconds.
+    - A new version is loaded, hash-checked and warmed up *before* it replaces the old one.
+    - The swap is a single reference assignment, so in-flight requests finish on the bundle they started with.
+    - Only pickle-free artifacts are loaded unless allow_pickle=True.
+    """
+
+    def __init__(self, registry_dir='models/registry', interval=5.0, allow_pickle=False):
+        self.registry_dir = registry_dir
+        self.interval = interval
+        self.allow_pickle = allow_pickle
+        self._bundle = None
+        self._stop = threading.Event()
+
+        self._refresh()  # Load the active version synchronously on startup
+        self._thread = threading.Thread(target=self._run, name='registry-watcher', daemon=True)
+        self._thread.start()
+
+    def current(self):
+        """Returns the active bundle. Read it once per request and use only that object."""
+        return self._bundle
+
+    def _refresh(self):
+        version = current_version(self.registry_dir)
+        if version is None or (self._bundle is not None and self._bundle.version == version):
+            return
+        try:
+            bundle = warm_up(load_bundle(version, self.registry_dir, self.allow_pickle))
+        except Exception as e:
+            # Keep serving the old version if the new one is broken or still being written
+            print(f" Could not activate model {version}: {e}")
+            return
+        self._bundle = bundle
+        print(f" Model bundle {version} is now active.")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._refresh()
+
+    def stop(self):
+        """Stops the background thread."""
+        self._stop.set()
+        self._thread.join()
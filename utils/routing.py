@@ -0,0 +1,256 @@
+import argparse
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import recall_score
+
+from utils.preprocessing import create_preprocessor, encode_target, hash_split
+from utils.monitoring import DriftMonitor, configure_logging, load_reference_stats, reference_stats, save_reference_stats
+from utils.registry import ModelBundle, current_version, load_bundle, publish_bundle, warm_up
+from utils.tracking import track_stage
+from utils.validation import normalize_records
+
+REFERENCE_FILE = 'drift_reference.json'  # Per-region drift reference, stored in models/regions/<region>/
+
+
+class ModelRouter:
+    """
+    Hosts several model bundles at once (e.g. one per hospital region) and routes every record to its
+    bundle by a key.
+    - score() groups the batch: each distinct preprocessor transforms its rows once and each model is
+      called once, so a mixed-region file costs one vectorized call per region, not one per row.
+    - Bundles whose fitted preprocessors are identical (same content hash) share a single object.
+    """
+
+    def __init__(self, default=None):
+        self.default = default  # Key used for records whose key is missing or unknown (None = reject them)
+        self.bundles = {}
+        self._preprocessors = {}  # content hash -> shared preprocessor
+
+    def __len__(self):
+        return len(self.bundles)
+
+    def add(self, key, bundle: ModelBundle):
+        """Registers a bundle under a key, reusing an identical preprocessor that is already loaded."""
+        shared = self._preprocessors.setdefault(joblib.hash(bundle.preprocessor), bundle.preprocessor)
+        self.bundles[str(key)] = bundle._replace(preprocessor=shared)
+
+    def keys(self):
+        return list(self.bundles)
+
+    def n_preprocessors(self):
+        """Number of distinct preprocessor objects held in memory."""
+        return len(self._preprocessors)
+
+    def _resolve(self, key):
+        """Bundle for a key, the default bundle for missing/unknown keys, or None if there is none."""
+        if key is not None and not pd.isna(key) and str(key) in self.bundles:
+            return self.bundles[str(key)]
+        return self.bundles.get(self.default) if self.default is not None else None
+
+    def bundle(self, key):
+        """Returns the bundle for a key (or the default bundle), raising a KeyError if there is none."""
+        bundle = self._resolve(key)
+        if bundle is None:
+            raise KeyError(f"No model bundle for '{key}' and no default bundle.")
+        return bundle
+
+    def score(self, X: pd.DataFrame, keys):
+        """
+        Scores a batch whose records may belong to different bundles.
+        Records whose key is missing or unknown (and no default is set) are not scored: they get NaN and
+        None, and one batch with a bad key never blocks the other rows.
+
+        Returns:
+        - probability (ndarray float64): Positive-class probability, aligned with the rows of X.
+        - routed_to (ndarray object): Version of the bundle that scored each row (None = unrouted).
+        """
+        codes, uniques = pd.factorize(pd.Series(np.asarray(keys, dtype=object)).astype('string'))
+        # Resolve every distinct key once (missing keys get code -1 -> the default bundle)
+        targets = [self._resolve(key) for key in uniques] + [self._resolve(None)]
+
+        probability = np.full(len(X), np.nan)
+        routed_to = np.full(len(X), None, dtype=object)
+
+        # 1. Group the keys by shared preprocessor so rows of bundles that share one are transformed together
+        by_preprocessor = {}
+        for code, target in enumerate(targets):
+            if target is not None:
+                by_preprocessor.setdefault(id(target.preprocessor), []).append(code)
+
+        for group in by_preprocessor.values():
+            code_of_row = np.where(codes < 0, len(uniques), codes)
+            rows = np.flatnonzero(np.isin(code_of_row, group))
+            preprocessor = targets[group[0]].preprocessor
+            X_processed = preprocessor.transform(X.iloc[rows])
+
+            # 2. One predict_proba call per model
+            by_model = {}
+            for code in group:
+                by_model.setdefault(id(targets[code].model), []).append(code)
+            for model_codes in by_model.values():
+                target = targets[model_codes[0]]
+                in_model = np.isin(code_of_row[rows], model_codes)
+                probability[rows[in_model]] = target.model.predict_proba(X_processed[in_model])[:, 1]
+                routed_to[rows[in_model]] = target.version
+
+        return probability, routed_to
+
+    def score_frame(self, df: pd.DataFrame, key_column='Region'):
+        """Convenience wrapper: returns a copy of df with 'Probability' and 'Model' columns added."""
+        probability, routed_to = self.score(df, df[key_column])
+        scored = df.copy()
+        scored['Probability'] = probability
+        scored['Model'] = routed_to
+        return scored
+
+    def routing_errors(self, keys, key_column='Region'):
+        """Rows that score() cannot route, in the same layout as the validation report (row, column, value, error)."""
+        keys = pd.Series(np.asarray(keys, dtype=object))
+        unrouted = np.flatnonzero([self._resolve(key) is None for key in keys])
+        return pd.DataFrame({'row': unrouted, 'column': key_column, 'value': keys.to_numpy()[unrouted],
+                             'error': f"No model bundle for this {key_column} (known: {', '.join(self.keys())})"})
+
+
+def train_region_bundles(df: pd.DataFrame, region_column='Region', target_column='class',
+                         share_preprocessor=False, min_rows=60, random_state=42):
+    """
+    Trains one bundle per region through the standard pipeline (hash_split -> create_preprocessor ->
+    encode_target -> Random Forest). hash_split removes exact duplicates and keeps identical patients in
+    one split, so the reported validation recall is not inflated by patients also seen in training.
+    - share_preprocessor=True fits a single preprocessor on the pooled Training rows of all regions,
+      so every bundle reuses it (one object in memory). Otherwise each region gets its own scaling.
+    - Regions with fewer than `min_rows` unique rows are skipped (too small for a 60/20/20 split).
+
+    Returns:
+    - bundles (dict): region -> ModelBundle.
+    - results_df (DataFrame): Rows and validation recall per region.
+    - references (dict): region -> drift reference statistics of its Training rows (regions differ in
+      Age and symptom prevalence, so each region's traffic is compared with its own training data).
+    """
+    splits = {}
+    for region, df_region in df.groupby(region_column):
+        split = hash_split(df_region.drop(columns=[region_column]), target_column)
+        n_rows = sum(len(part) for part in split[:3])
+        if n_rows < min_rows:
+            print(f" Skipping region {region}: only {n_rows} unique rows.")
+            continue
+        splits[str(region)] = split
+
+    shared = None
+    if share_preprocessor:
+        shared = create_preprocessor().fit(pd.concat([split[0] for split in splits.values()]))
+
+    bundles, results, references = {}, [], {}
+    for region, (X_train, X_val, X_test, y_train, y_val, y_test) in splits.items():
+        with track_stage(f'region_fit.{region}'):
+            preprocessor = shared if shared is not None else create_preprocessor().fit(X_train)
+            y_train_enc, y_val_enc, _, label_encoder = encode_target(y_train, y_val, y_test)
+            model = RandomForestClassifier(n_estimators=100, random_state=random_state)
+            model.fit(preprocessor.transform(X_train), y_train_enc)
+
+        rec = recall_score(y_val_enc, model.predict(preprocessor.transform(X_val)))
+        bundles[region] = ModelBundle(region, model, preprocessor, label_encoder)
+        references[region] = reference_stats(X_train)
+        results.append({"Region": region, "Train Rows": len(X_train),
+                        "Positive Rate": float(np.mean(y_train_enc)), "Val Recall": rec})
+
+    return bundles, pd.DataFrame(results), references
+
+
+def publish_region_bundles(bundles: dict, regions_dir='../models/regions', references=None):
+    """
+    Publishes every region to its own registry (models/regions/<region>/), so each can be rolled back alone.
+    The region's drift reference (from train_region_bundles) is saved next to it as drift_reference.json.
+    """
+    versions = {}
+    for region, bundle in bundles.items():
+        registry_dir = os.path.join(regions_dir, region)
+        versions[region] = publish_bundle(bundle.model, bundle.preprocessor, bundle.target_encoder,
+                                          registry_dir=registry_dir, notes=f'Region {region}')
+        if references is not None and region in references:
+            save_reference_stats(references[region], os.path.join(registry_dir, REFERENCE_FILE))
+    return versions
+
+
+def load_router(regions_dir='models/regions', default=None, allow_pickle=False):
+    """
+    Loads the active version of every region registry into one router (hash-checked and warmed up).
+    Only pickle-free artifacts are loaded unless allow_pickle=True (see load_bundle).
+    Returns None if no region has a published bundle.
+    """
+    if not os.path.isdir(regions_dir):
+        return None
+    router = ModelRouter(default=default)
+    for region in sorted(os.listdir(regions_dir)):
+        registry_dir = os.path.join(regions_dir, region)
+        version = current_version(registry_dir) if os.path.isdir(registry_dir) else None
+        if version is None:
+            continue
+        bundle = warm_up(load_bundle(version, registry_dir, allow_pickle))
+        router.add(region, bundle._replace(version=f'{region}/{version}'))
+    return router if len(router) else None
+
+
+def load_region_monitors(regions_dir='models/regions', **monitor_args):
+    """One DriftMonitor per region that has a saved drift reference (region -> monitor, empty if none)."""
+    monitors = {}
+    if not os.path.isdir(regions_dir):
+        return monitors
+    for region in sorted(os.listdir(regions_dir)):
+        path = os.path.join(regions_dir, region, REFERENCE_FILE)
+        if os.path.exists(path):
+            monitors[region] = DriftMonitor(load_reference_stats(path), name=region, **monitor_args)
+    return monitors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils.routing',
+                                     description='Score a mixed-region batch file with the region bundles.')
+    parser.add_argument('input', help='CSV with Age, the 14 symptom columns and a region column')
+    parser.add_argument('output', help='Where to write the scored CSV')
+    parser.add_argument('--key', default='Region', help='Column holding the region of each record')
+    parser.add_argument('--regions-dir', default='models/regions')
+    parser.add_argument('--default', help='Region used for records with a missing or unknown key')
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    router = load_router(args.regions_dir, args.default)
+    if router is None:
+        raise SystemExit(f"No region bundles published in {args.regions_dir}.")
+
+    batch = pd.read_csv(args.input)
+    if args.key not in batch:
+        raise SystemExit(f"Column '{args.key}' not found in {args.input}.")
+    clean, errors = normalize_records(batch)  # Invalid rows are reported instead of being scored
+    probability, routed_to = router.score(clean, batch[args.key].to_numpy()[clean.index])
+    errors = pd.concat([errors, router.routing_errors(batch[args.key], args.key)], ignore_index=True)
+
+    # Input drift per region: the rows scored by a region's model against that region's training reference
+    routed_region = np.array([None if version is None else version.split('/')[0] for version in routed_to])
+    for region, monitor in load_region_monitors(args.regions_dir, emit_every=len(clean) + 1).items():
+        in_region = routed_region == region
+        if in_region.any():
+            monitor.update(clean[in_region])
+            monitor.emit()  # Logs the metrics and warns for drifted features
+
+    scored = batch.copy()
+    scored['Probability'] = np.nan
+    scored['Model'] = None
+    scored.loc[clean.index, 'Probability'] = probability
+    scored.loc[clean.index, 'Model'] = routed_to
+    # Per-row report: every reason a row was not scored
+    messages = errors.groupby('row')['error'].agg(lambda e: '; '.join(dict.fromkeys(e)))
+    scored['Error'] = messages.reindex(range(len(batch))).to_numpy()
+    scored.to_csv(args.output, index=False)
+
+    n_skipped = int(scored['Probability'].isna().sum())
+    print(f" Scored {len(batch) - n_skipped} rows with {len(router)} region bundles "
+          f"({router.n_preprocessors()} distinct preprocessors); {n_skipped} rows skipped (see the Error column).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Lightweight local experiment store: every run appends JSON lines to experiments/runs.jsonl.
+
+Usage from the notebooks:
+    run = start_run('modeling', params={'cv': 5})
+    with track_stage('grid_search'):
+        grid_search.fit(X_train, y_train)
+    run.log_metrics({'val_recall': 0.94})
+    run.log_artifact('../models/best_model.joblib')
+
+Query from the command line (repository root):
+    python -m utils.tracking list
+    python -m utils.tracking show <run_id>
+    python -m utils.tracking compare <run_id> <run_id>
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+DEFAULT_STORE = '../experiments/runs.jsonl'  # Relative to the notebooks/ folder
+TRACKED_LIBRARIES = ['numpy', 'pandas', 'sklearn', 'xgboost', 'joblib']
+
+_active_run = None
+
+
+def _library_versions():
+    versions = {'python': platform.python_version()}
+    for name in TRACKED_LIBRARIES:
+        module = sys.modules.get(name)
+        if module is None:
+            try:
+                module = __import__(name)
+            except ImportError:
+                continue
+        versions[name] = getattr(module, '__version__', 'unknown')
+    return versions
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process so far (MB), or None where getrusage is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 2)  # bytes on macOS, KB on Linux
+
+
+def data_hash(df: pd.DataFrame):
+    """Order-sensitive SHA-256 of a DataFrame's content (values, column names and dtypes)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class Run:
+    """One tracked run. Every call appends one event line to the store; nothing is ever rewritten."""
+
+    def __init__(self, name, store=DEFAULT_STORE, params=None):
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.name = name
+        self.store = store
+        os.makedirs(os.path.dirname(store) or '.', exist_ok=True)
+        self._write('start', {'name': name, 'params': params or {}, 'versions': _library_versions(),
+                              'host': platform.node()})
+
+    def _write(self, event, payload):
+        record = {'run_id': self.run_id, 'event': event,
+                  'time': datetime.now(timezone.utc).isoformat(timespec='seconds'), **payload}
+        with open(self.store, 'a') as fh:
+            fh.write(json.dumps(record, default=str) + '\n')
+
+    def log_params(self, params):
+        self._write('params', {'params': params})
+
+    def log_metrics(self, metrics, stage=None):
+        self._write('metrics', {'stage': stage, 'metrics': {k: float(v) for k, v in metrics.items()}})
+
+    def log_data(self, name, df: pd.DataFrame):
+        """Records the content hash and shape of a dataset used by this run."""
+        self._write('data', {'name': name, 'sha256': data_hash(df), 'shape': list(df.shape)})
+
+    def log_artifact(self, path, sha256=None):
+        """Records an artifact file and its SHA-256 (computed if not given)."""
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as fh:
+                for block in iter(lambda: fh.read(1 << 20), b''):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+        self._write('artifact', {'path': path, 'sha256': sha256, 'bytes': os.path.getsize(path)})
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times a block: wall-clock, CPU (this process + finished child processes) and peak memory.
+        - Memory is the process's peak resident set size (ru_maxrss), which includes the C/C++ allocations
+          of sklearn and xgboost and costs nothing to read. No tracer runs while the block is timed.
+        - rss_growth_mb is how much the block raised that peak (0 if an earlier stage already used more).
+        Worker pools that stay alive (e.g. joblib's loky workers) are not included in the CPU time.
+        """
+        rss_start = _peak_rss_mb()
+        wall_start, cpu_start = time.perf_counter(), os.times()
+        status = 'ok'
+        try:
+            yield self
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu_end = os.times()
+            cpu = sum(cpu_end[:4]) - sum(cpu_start[:4])  # user + system, self + children
+            rss_end = _peak_rss_mb()
+            self._write('stage', {'stage': name, 'status': status, 'wall_s': round(wall, 4),
+                                  'cpu_s': round(cpu, 4), 'peak_rss_mb': rss_end,
+                                  'rss_growth_mb': None if rss_end is None else round(rss_end - rss_start, 2)})
+
+
+def start_run(name, store=DEFAULT_STORE, params=None):
+    """Starts a run and makes it the active run used by track_stage() in the utils modules."""
+    global _active_run
+    _active_run = Run(name, store, params)
+    print(f" Tracking run {_active_run.run_id} ({name}) in {store}")
+    return _active_run
+
+
+def active_run():
+    """Returns the active run, or None when nothing is being tracked."""
+    return _active_run
+
+
+def track_stage(name):
+    """Times a block in the active run; does nothing when no run was started."""
+    return _active_run.stage(name) if _active_run is not None else contextlib.nullcontext()
+
+
+# ------------------------------------------------------------------------------------------------
+# Query / compare
+# ------------------------------------------------------------------------------------------------
+def load_runs(store='experiments/runs.jsonl'):
+    """Reads the store and returns one summary dict per run (oldest first)."""
+    runs = {}
+    with open(store) as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run = runs.setdefault(record['run_id'], {'run_id': record['run_id'], 'name': None, 'started': None,
+                                                     'params': {}, 'versions': {}, 'stages': {}, 'metrics': {},
+                                                     'data': {}, 'artifacts': {}})
+            event = record['event']
+            if event == 'start':
+                run.update(name=record['name'], started=record['time'], versions=record['versions'])
+                run['params'].update(record['params'])
+            elif event == 'params':
+                run['params'].update(record['params'])
+            elif event == 'metrics':
+                prefix = f"{record['stage']}." if record.get('stage') else ''
+                run['metrics'].update({prefix + k: v for k, v in record['metrics'].items()})
+            elif event == 'stage':
+                run['stages'][record['stage']] = {k: record.get(k) for k in ('wall_s', 'cpu_s', 'peak_rss_mb',
+                                                                           'rss_growth_mb', 'status')}
+            elif event == 'data':
+                run['data'][record['name']] = record['sha256']
+            elif event == 'artifact':
+                run['artifacts'][record['path']] = record['sha256']
+    return list(runs.values())
+
+
+def _find(runs, run_id):
+    matches = [run for run in runs if run['run_id'].startswith(run_id)]
+    if len(matches) != 1:
+        raise SystemExit(f"No unique run matches '{run_id}'.")
+    return matches[0]
+
+
+def _flatten(run):
+    flat = {'name': run['name'], 'started': run['started']}
+    flat.update({f'param.{k}': v for k, v in run['params'].items()})
+    flat.update({f'metric.{k}': v for k, v in run['metrics'].items()})
+    for stage, values in run['stages'].items():
+        flat.update({f'stage.{stage}.{k}': v for k, v in values.items()})
+    flat.update({f'data.{k}': v[:12] for k, v in run['data'].items()})
+    flat.update({f'artifact.{os.path.basename(k)}': v[:12] for k, v in run['artifacts'].items()})
+    flat.update({f'version.{k}': v for k, v in run['versions'].items()})
+    return flat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils.tracking', description='Query the experiment store.')
+    parser.add_argument('--store', default='experiments/runs.jsonl')
+    commands = parser.add_subparsers(dest='command', required=True)
+    list_parser = commands.add_parser('list', help='One line per run')
+    list_parser.add_argument('--name', help='Only runs with this name')
+    commands.add_parser('show', help='All details of one run').add_argument('run_id')
+    compare_parser = commands.add_parser('compare', help='Side-by-side diff of runs')
+    compare_parser.add_argument('run_ids', nargs='+')
+    compare_parser.add_argument('--all', action='store_true', help='Also show identical values')
+    args = parser.parse_args(argv)
+
+    runs = load_runs(args.store)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_colwidth', 40)
+
+    if args.command == 'list':
+        rows = [{'run_id': r['run_id'], 'name': r['name'], 'started': r['started'],
+                 'total_wall_s': round(sum(s['wall_s'] for s in r['stages'].values()), 2),
+                 **{k: round(v, 4) for k, v in r['metrics'].items()}}
+                for r in runs if args.name is None or r['name'] == args.name]
+        print(pd.DataFrame(rows).to_string(index=False) if rows else 'No runs recorded.')
+    elif args.command == 'show':
+        print(json.dumps(_find(runs, args.run_id), indent=2))
+    elif args.command == 'compare':
+        selected = [_find(runs, run_id) for run_id in args.run_ids]
+        table = pd.DataFrame({r['run_id']: _flatten(r) for r in selected})
+        if not args.all:
+            table = table[table.astype(str).nunique(axis=1) > 1]  # Only what changed
+        print(table.to_string())
+
+
+if __name__ == '__main__':
+    main()
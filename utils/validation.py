@@ -0,0 +1,137 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from utils.preprocessing import NUMERICAL_FEATURES, CATEGORICAL_FEATURES, unpack_records
+
+# Accepted spellings after stripping whitespace and lower-casing
+YES_VALUES = {'yes', 'y', 'true', 't', '1'}
+NO_VALUES = {'no', 'n', 'false', 'f', '0'}
+
+AGE_MIN, AGE_MAX = 1, 120  # Same range as the App's Age input
+
+ValidationResult = namedtuple('ValidationResult', ['keys', 'valid', 'errors'])
+
+
+def _factorize_fixed_width(values: np.ndarray):
+    """
+    pd.factorize for NumPy fixed-width string arrays ('<U' / 'S') without creating a Python object per row:
+    the raw bytes of every value are read as uint64 words and factorized word by word.
+    """
+    n = len(values)
+    raw = np.ascontiguousarray(values).view(np.uint8).reshape(n, values.dtype.itemsize)
+    if raw.shape[1] % 8:
+        padded = np.zeros((n, -(-raw.shape[1] // 8) * 8), dtype=np.uint8)
+        padded[:, :raw.shape[1]] = raw
+        raw = padded
+    words = raw.view(np.uint64)
+
+    codes = None
+    for j in range(words.shape[1]):
+        word_codes, word_uniques = pd.factorize(words[:, j])
+        if codes is None:
+            codes = word_codes
+        elif len(word_uniques) > 1:  # A word with a single value can't separate anything
+            codes, _ = pd.factorize(codes * len(word_uniques) + word_codes)
+    if codes is None:
+        codes = np.zeros(n, dtype=np.int64)
+
+    first = np.empty(codes.max() + 1 if n else 0, dtype=np.int64)
+    first[codes[::-1]] = np.arange(n - 1, -1, -1)  # Position of the first occurrence of every code
+    return codes, values[first]
+
+
+def _normalize_yes_no(values):
+    """
+    Maps a column to 1 (Yes), 0 (No) or -1 (invalid).
+    - Numeric and boolean columns (e.g. 1/0 read as float because of a blank cell): 1/True -> Yes, 0/False -> No.
+    - Text: only the distinct values are normalized (hash-based factorize), then mapped back to all rows,
+      so the cost is one pass over the column whatever the number of typos.
+    """
+    if not isinstance(values, pd.Series):
+        values = np.asarray(values)
+    if pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        numeric = values.to_numpy(dtype=np.float64, na_value=np.nan) if isinstance(values, pd.Series) \
+            else values.astype(np.float64)
+        return np.where(numeric == 1, 1, np.where(numeric == 0, 0, -1)).astype(np.int8)
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'US':
+        codes, uniques = _factorize_fixed_width(values)  # Native NumPy strings: no object copy
+    else:
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)  # Series stay in their native string storage
+    uniques = np.asarray(uniques, dtype=object)
+    cleaned = np.char.lower(np.char.strip(uniques.astype(str)))
+    lookup = np.full(len(uniques) + 1, -1, dtype=np.int8)  # Last slot: missing values (code -1)
+    lookup[:len(uniques)][np.isin(cleaned, list(YES_VALUES))] = 1
+    lookup[:len(uniques)][np.isin(cleaned, list(NO_VALUES))] = 0
+
+    # Mixed text/number columns: numbers are matched by value (1.0 -> Yes), not by their text ('1.0')
+    for index, value in enumerate(uniques):
+        if isinstance(value, (bool, int, float, np.number)) and not isinstance(value, str):
+            lookup[index] = 1 if value == 1 else 0 if value == 0 else -1
+    return lookup[codes]
+
+
+def validate_records(X):
+    """
+    Validates and normalizes raw records against the 15-feature schema (Age + 14 Yes/No symptoms).
+    - Symptoms: case and whitespace insensitive ('yes', ' Y ', 'TRUE', '1' -> Yes). Anything else is an
+      error instead of being silently encoded as "No" by OneHotEncoder(handle_unknown='ignore').
+    - Age: must be a whole number between 1 and 120.
+    X can be a DataFrame or a dict of columns. Missing columns raise a ValueError.
+
+    Returns (ValidationResult):
+    - keys (ndarray uint32): Packed encoding (see pack_records) of the valid rows.
+    - valid (ndarray bool): Which input rows passed.
+    - errors (DataFrame): One line per problem: row, column, value, error.
+    """
+    missing = [name for name in NUMERICAL_FEATURES + CATEGORICAL_FEATURES if name not in X]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+    n_bits = len(CATEGORICAL_FEATURES)
+    error_parts = []
+
+    # 1. Age: numeric, whole years, in range
+    raw_age = np.asarray(X['Age'])
+    age = pd.to_numeric(pd.Series(raw_age), errors='coerce').to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        age_ok = (age >= AGE_MIN) & (age <= AGE_MAX) & (age == np.round(age))
+    valid = age_ok.copy()
+    bad = np.flatnonzero(~age_ok)
+    if len(bad):
+        error_parts.append(pd.DataFrame({
+            'row': bad, 'column': 'Age', 'value': raw_age[bad],
+            'error': f'Age must be a whole number between {AGE_MIN} and {AGE_MAX}'
+        }))
+    keys = np.where(age_ok, age, 0).astype(np.uint32) << np.uint32(n_bits)
+
+    # 2. Symptoms: normalized Yes/No, written straight into the key bits
+    for bit, name in enumerate(CATEGORICAL_FEATURES):
+        code = _normalize_yes_no(X[name])
+        is_bad = code < 0
+        if is_bad.any():
+            bad = np.flatnonzero(is_bad)
+            valid &= ~is_bad
+            error_parts.append(pd.DataFrame({
+                'row': bad, 'column': name, 'value': np.asarray(X[name])[bad].astype(object),
+                'error': "Expected 'Yes' or 'No'"
+            }))
+        keys |= (code == 1).astype(np.uint32) << np.uint32(bit)
+
+    errors = pd.concat(error_parts, ignore_index=True) if error_parts else \
+        pd.DataFrame(columns=['row', 'column', 'value', 'error'])
+    errors = errors.sort_values(['row', 'column'], kind='stable').reset_index(drop=True)
+
+    return ValidationResult(keys[valid], valid, errors)
+
+
+def normalize_records(X):
+    """
+    Convenience wrapper: returns the valid rows as a clean DataFrame (canonical 'Yes'/'No' values and
+    integer Age, ready for preprocessor.transform) together with the error report.
+    """
+    result = validate_records(X)
+    clean = unpack_records(result.keys)
+    clean.index = np.flatnonzero(result.valid)  # Keep the original row numbers
+    return clean, result.errors
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from utils.preprocessing import CATEGORICAL_FEATURES, pack_records, unpack_records
+
+AGE_SWEEP = np.arange(1, 121)
+
+
+def build_whatif_matrix(record):
+    """
+    Builds every counterfactual of one patient as a single DataFrame (raw features):
+    - row 0: the patient as entered
+    - rows 1..14: one symptom flipped (Yes <-> No)
+    - remaining rows: the same symptoms at every age from 1 to 120
+    The variants are generated on the packed key (bit flips / Age bits) and unpacked once.
+    """
+    key = pack_records(record)[:1]
+    n_symptoms = len(CATEGORICAL_FEATURES)
+    symptom_mask = np.uint32((1 << n_symptoms) - 1)
+
+    flipped = key ^ (np.uint32(1) << np.arange(n_symptoms, dtype=np.uint32))
+    aged = (key & symptom_mask) | (AGE_SWEEP.astype(np.uint32) << np.uint32(n_symptoms))
+
+    return unpack_records(np.concatenate([key, flipped, aged]))
+
+
+def sensitivity_sweep(model, preprocessor, record):
+    """
+    Scores all what-if variants of a patient with one predict_proba call.
+
+    Returns:
+    - base_probability (float): The patient's own risk.
+    - flips (DataFrame): Risk and change in risk when each symptom is toggled, largest change first.
+    - age_curve (DataFrame): Risk for every age, other inputs unchanged.
+    """
+    X = build_whatif_matrix(record)
+    probability = model.predict_proba(preprocessor.transform(X))[:, 1]
+
+    n_symptoms = len(CATEGORICAL_FEATURES)
+    base_probability = float(probability[0])
+
+    flips = pd.DataFrame({
+        'Symptom': CATEGORICAL_FEATURES,
+        'Changed To': [X[name].iloc[1 + i] for i, name in enumerate(CATEGORICAL_FEATURES)],
+        'Probability': probability[1:1 + n_symptoms],
+        'Change': probability[1:1 + n_symptoms] - base_probability
+    })
+    flips = flips.reindex(flips['Change'].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+    age_curve = pd.DataFrame({'Age': AGE_SWEEP, 'Probability': probability[1 + n_symptoms:]})
+
+    return base_probability, flips, age_curve